@@ -0,0 +1,209 @@
+import math
+import random
+import threading
+import time
+
+from engine import Direction, BlitzBoard, MOVE_ADD, MOVE_PASS, opponent
+
+# глубина спуска по дереву за итерацию: в позицию можно вернуться, и без предела спуск мог бы не кончиться
+MAX_TREE_DEPTH = 64
+# сколько случайных клеток границы пробуется, прежде чем перечислить все клетки для захвата
+RANDOM_MOVE_TRIES = 4
+
+
+def random_move(board):
+    # быстрый ход для симуляций: случайная клетка границы, которую можно захватить;
+    # все такие клетки перечисляются, только если пробы не попали
+    frontier = list(board.frontier[board.current_direction])
+    for _ in range(min(RANDOM_MOVE_TRIES, len(frontier))):
+        index = random.choice(frontier)
+        x, y = index % board.side_size, index // board.side_size
+        if board.is_cell_can_be_captured(x, y):
+            return MOVE_ADD, random.randrange(len(board.added)), x, y
+    cells = board.capturable_cells()
+    if not cells:
+        return None
+    x, y = random.choice(cells)
+    return MOVE_ADD, random.randrange(len(board.added)), x, y
+
+
+def evaluate(board, direction: Direction):
+    # оценка незаконченной партии: доля клеток игрока среди всех занятых
+    own = board.cell_counts[direction]
+    enemy = board.cell_counts[opponent(direction)]
+    return 0.5 + (own - enemy) / (2 * (own + enemy + 1))
+
+
+def move_key(board, move: tuple):
+    # ход в статистике узла: клетка added по виду, а не по номеру, потому что в одну
+    # и ту же позицию поля игрок приходит с разными клетками added
+    if move[0] == MOVE_ADD:
+        return MOVE_ADD, board.added[move[1]], move[2], move[3]
+    return move
+
+
+class Node:
+    # позиция в дереве поиска: сколько раз через неё прошли и статистика ходов из неё,
+    # move_key -> [посещения, сумма наград игрока, сделавшего ход]
+    def __init__(self, age: int):
+        self.visits = 0
+        self.children = {}
+        self.age = age
+
+    def uct(self, move, exploration: float):
+        visits, score = self.children[move]
+        return score / visits + exploration * math.sqrt(math.log(self.visits) / visits)
+
+
+# таблица узлов поиска по хэшу Зобриста поля. В одну позицию можно прийти разными
+# ходами, и узел у неё один, поэтому статистика собирается со всех путей, а следующий
+# поиск продолжает статистику прошлых. При переполнении вытесняется половина узлов:
+# сначала из самых старых поисков, а среди них - с наименьшим числом посещений
+class TranspositionTable:
+    def __init__(self, size: int = 50000):
+        self.size = size
+        self.entries = {}
+        self.age = 0
+        # сколько раз поиск взял узел, созданный прошлыми поисками
+        self.hits = 0
+
+    def new_search(self):
+        self.age += 1
+
+    def get(self, key: int):
+        node = self.entries.get(key)
+        if node is not None and node.age != self.age:
+            self.hits += 1
+            node.age = self.age
+        return node
+
+    def get_node(self, key: int):
+        node = self.get(key)
+        if node is None:
+            if len(self.entries) >= self.size:
+                self.evict()
+            node = self.entries[key] = Node(self.age)
+        return node
+
+    def evict(self):
+        victims = sorted(self.entries, key=lambda key: (self.entries[key].age, self.entries[key].visits))
+        for key in victims[:len(victims) // 2]:
+            del self.entries[key]
+
+
+# поиск Монте-Карло по дереву позиций: узлы берутся из таблицы по хэшу поля, поэтому
+# случайные клетки после хода ведут в разные узлы, а одинаковые позиции - в один.
+# Все итерации идут на одной копии поля: ходы делаются make_move и отменяются в конце
+# итерации, а симуляция после дерева короткая и оценивается по числу клеток
+class MonteCarloSearch:
+    def __init__(self, exploration: float = 1.4, playout_depth: int = 6, table: TranspositionTable = None):
+        self.exploration = exploration
+        self.playout_depth = playout_depth
+        self.table = table or TranspositionTable()
+        self.playouts = 0
+        self.root = None
+
+    def search(self, board, time_budget: float):
+        deadline = time.monotonic() + time_budget
+        state = board.clone()
+        root_moves = state.legal_moves()
+        if not root_moves:
+            return None
+        self.root = self.table.get_node(state.hash)
+        while True:
+            self.iterate(state)
+            if time.monotonic() >= deadline:
+                break
+        children = self.root.children
+        visited = [move for move in root_moves if move_key(state, move) in children]
+        if not visited:
+            return random.choice(root_moves)
+        return max(visited, key=lambda move: children[move_key(state, move)][0])
+
+    def iterate(self, state):
+        # новый seed генератора копии: unmake_move возвращает генератор к прежнему
+        # состоянию, и без этого случайные клетки во всех итерациях были бы одинаковыми
+        state.random.seed(random.getrandbits(64))
+        # путь итерации: (узел, move_key хода из него, игрок, сделавший ход)
+        path = []
+        # выбор: спускаемся, пока все ходы узла уже есть в дереве
+        while not state.is_win() and len(path) < MAX_TREE_DEPTH:
+            moves = state.legal_moves()
+            if not moves:
+                break
+            node = self.table.get_node(state.hash)
+            keys = [move_key(state, move) for move in moves]
+            untried = [index for index, key in enumerate(keys) if key not in node.children]
+            if untried:
+                index = random.choice(untried)
+                node.children[keys[index]] = [0, 0.0]
+                path.append((node, keys[index], state.current_direction))
+                state.make_move(moves[index])
+                break
+            index = max(range(len(moves)), key=lambda index: node.uct(keys[index], self.exploration))
+            path.append((node, keys[index], state.current_direction))
+            state.make_move(moves[index])
+        rewards = self.playout(state)
+        while state.undo_stack:
+            state.unmake_move()
+        for node, key, direction in path:
+            node.visits += 1
+            statistics = node.children[key]
+            statistics[0] += 1
+            statistics[1] += rewards[direction]
+
+    def playout(self, state):
+        self.playouts += 1
+        for _ in range(self.playout_depth):
+            if state.is_win():
+                break
+            state.make_move(random_move(state) or (MOVE_PASS,))
+        if state.is_win():
+            return {state.winner: 1.0, opponent(state.winner): 0.0}
+        orange = evaluate(state, Direction.ORANGE)
+        return {Direction.ORANGE: orange, Direction.BLUE: 1.0 - orange}
+
+
+def time_budget(board, max_time: float):
+    # в блитце нужно успеть до конца таймера хода
+    if type(board) == BlitzBoard:
+        return max(0.1, min(max_time, board.timer - 1))
+    return max_time
+
+
+# компьютерный игрок: поиск идёт в отдельном потоке на копии поля,
+# главный цикл только забирает готовый ход через poll
+class ComputerPlayer:
+    def __init__(self, direction: Direction, max_time: float = 2.0):
+        self.direction = direction
+        self.max_time = max_time
+        self.thread = None
+        self.move = None
+        self.turn_number = None
+        # узлы поиска живут между ходами: ответ соперника обычно уже просчитан прошлым поиском
+        self.table = TranspositionTable()
+
+    def think(self, board):
+        self.table.new_search()
+        search = MonteCarloSearch(table=self.table)
+        self.move = search.search(board, time_budget(board, self.max_time))
+
+    def poll(self, board):
+        # возвращает True, если компьютер сделал ход
+        if board.current_direction != self.direction:
+            return False
+        if self.thread is None or self.turn_number != board.turn_number:
+            if self.thread is not None and self.thread.is_alive():
+                return False
+            self.turn_number = board.turn_number
+            self.move = None
+            self.thread = threading.Thread(target=self.think, args=(board.clone(),), daemon=True)
+            self.thread.start()
+            return False
+        if self.thread.is_alive():
+            return False
+        move, self.move = self.move, None
+        self.thread = None
+        if move is None or not board.apply_move(move):
+            board.pass_turn()
+        return True
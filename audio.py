@@ -0,0 +1,86 @@
+import random
+import time
+
+import pygame
+
+# звуки событий поля: имя группы -> варианты звука и приоритет.
+# при нехватке каналов звук с меньшим приоритетом уступает канал более важному
+sound_groups = {
+    'bomb': (['bomb.wav', 'bomb2.wav'], 2),
+    'rook': (['rook.mp3'], 1),
+}
+
+
+# проигрывание звуков через свой набор каналов микшера. Запросы за кадр собираются
+# в update: сколько бы раз событие ни случилось за кадр, звук играет один раз и не чаще
+# min_interval секунд. Без микшера или с mute звуки не играют и ничего не стоят
+class SoundManager:
+    def __init__(self, sounds: dict, channel_count: int = 8, min_interval: float = 0.08):
+        # sounds - загруженные звуки по имени файла, могут дозагружаться в фоне
+        self.sounds = sounds
+        self.channel_count = channel_count
+        self.min_interval = min_interval
+        self.is_muted = False
+        self.channels = None
+        # для каждого канала: приоритет и время начала звука на нём
+        self.voices = []
+        self.pending = set()
+        self.last_played = {}
+
+    def init_channels(self):
+        # каналы резервируются, чтобы музыка и другие вызовы Sound.play их не занимали
+        if pygame.mixer.get_init() is None:
+            self.is_muted = True
+            return None
+        pygame.mixer.set_num_channels(max(pygame.mixer.get_num_channels(), self.channel_count))
+        pygame.mixer.set_reserved(self.channel_count)
+        self.channels = [pygame.mixer.Channel(index) for index in range(self.channel_count)]
+        self.voices = [(0, 0.0)] * self.channel_count
+
+    def play(self, group: str):
+        if not self.is_muted:
+            self.pending.add(group)
+
+    def update(self):
+        # вызывается раз в кадр
+        if not self.pending:
+            return None
+        if self.channels is None:
+            self.init_channels()
+        pending, self.pending = self.pending, set()
+        if self.is_muted:
+            return None
+        now = time.monotonic()
+        for group in sorted(pending, key=lambda name: -sound_groups[name][1]):
+            if now - self.last_played.get(group, -self.min_interval) < self.min_interval:
+                continue
+            names, priority = sound_groups[group]
+            sound = self.sounds.get(random.choice(names))
+            if sound is None:
+                # звук ещё не загрузился
+                continue
+            index = self.find_channel(priority)
+            if index is None:
+                continue
+            self.channels[index].play(sound)
+            self.voices[index] = (priority, now)
+            self.last_played[group] = now
+
+    def find_channel(self, priority: int):
+        # свободный канал, иначе самый старый звук с приоритетом не выше нового
+        candidates = []
+        for index, channel in enumerate(self.channels):
+            if not channel.get_busy():
+                return index
+            voice_priority, started = self.voices[index]
+            if voice_priority <= priority:
+                candidates.append((voice_priority, started, index))
+        if not candidates:
+            return None
+        return min(candidates)[2]
+
+    def stop(self):
+        self.pending.clear()
+        if self.channels is not None:
+            for channel in self.channels:
+                channel.stop()
@@ -0,0 +1,229 @@
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+from engine import Direction, DefaultBoard, DeadBoard, BombCell, YandexCell, DeadCell, TowerCell, MOVE_ADD, get_cell
+from grid import ArrayBoard
+from snapshot import Snapshot, encode_snapshot
+
+# замеры операций с полем на разных размерах, без окна (SDL dummy):
+# python benchmark.py --output baseline.json
+# python benchmark.py --compare baseline.json
+sizes = [8, 16, 32, 64]
+# большие поля рисуются через камеру, для них замеряется только отрисовка
+render_sizes = sizes + [128, 256]
+SEED = 2024
+
+
+def measure(setup, operation, repeat: int):
+    # setup готовит состояние вне замера, operation замеряется; время в микросекундах
+    # упавший замер не останавливает остальные, а попадает в результаты с ошибкой
+    timings = []
+    for _ in range(repeat):
+        state = setup()
+        start = time.perf_counter()
+        try:
+            operation(state)
+        except Exception as error:
+            return {'error': f'{type(error).__name__}: {error}'}
+        timings.append((time.perf_counter() - start) * 1e6)
+    return {'median_us': statistics.median(timings), 'min_us': min(timings), 'repeat': repeat}
+
+
+def filled_board(side_size: int, board_type=DefaultBoard):
+    # поле, наполовину занятое клетками игроков, как в середине партии
+    board = board_type(side_size, SEED)
+    for y in range(side_size):
+        for x in range(side_size):
+            if board.random.random() < 0.5:
+                direction = Direction.ORANGE if x < side_size // 2 else Direction.BLUE
+                board.set_cell(x, y, get_cell(TowerCell, direction))
+    return board
+
+
+def nearly_dead_board(side_size: int):
+    # поле режима "Death", где свободными остались три клетки
+    board = DeadBoard(side_size, SEED)
+    free = [(x, y) for y in range(side_size) for x in range(side_size)
+            if board.table[y][x].direction == Direction.NOBODY]
+    for x, y in free[3:]:
+        board.set_cell(x, y, get_cell(DeadCell, Direction.NONE))
+    return board
+
+
+def with_cell(board, cell_type):
+    # копия поля с клеткой cell_type текущего игрока рядом с его клетками
+    board = board.clone(SEED)
+    x, y = board.capturable_cells()[0]
+    board.set_cell(x, y, get_cell(cell_type, board.current_direction))
+    return board
+
+
+def board_benchmarks(side_size: int, repeat: int):
+    board = filled_board(side_size)
+    dead_board = nearly_dead_board(side_size)
+    target = board.capturable_cells()[0]
+    results = {
+        'construct': measure(lambda: side_size, lambda size: DefaultBoard(size, SEED), repeat),
+        'change_current_direction': measure(lambda: board.clone(SEED), lambda state: state.change_current_direction(),
+                                            repeat),
+        'add_new_cell': measure(lambda: board.clone(SEED), lambda state: state.add_new_cell(0, *target), repeat),
+        'is_cell_can_be_captured': measure(lambda: board, lambda state: [state.is_cell_can_be_captured(x, y)
+                                                                         for y in range(side_size)
+                                                                         for x in range(side_size)], repeat),
+        'bomb_activation': measure(lambda: with_cell(board, BombCell), lambda state: activate_last(state, BombCell),
+                                   repeat),
+        'yandex_activation': measure(lambda: with_cell(board, YandexCell),
+                                     lambda state: activate_last(state, YandexCell), repeat),
+        'legal_moves': measure(lambda: board, lambda state: state.legal_moves(), repeat),
+        'make_unmake': measure(lambda: board.clone(SEED), lambda state: make_unmake(state, (MOVE_ADD, 0, *target)),
+                               repeat),
+        'snapshot_save': measure(lambda: board, encode_snapshot, repeat),
+        'snapshot_restore': measure(lambda: Snapshot(encode_snapshot(board)), lambda state: state.restore(), repeat),
+        'delete_cell': measure(lambda: dead_board.clone(SEED), lambda state: state.delete_cell(), repeat),
+        'is_win': measure(lambda: board, lambda state: state.is_win(), repeat),
+    }
+    results.update(array_benchmarks(board, dead_board, repeat))
+    return results
+
+
+def array_benchmarks(board, dead_board, repeat: int):
+    # маски ArrayBoard замеряются, только если совпадают с правилами полей engine
+    array_board = ArrayBoard.from_board(board)
+    array_dead_board = ArrayBoard.from_board(dead_board)
+    names = ['array_capturable', 'array_capturable_death', 'array_yandex_captures', 'array_empty_count',
+             'array_from_board']
+    errors = array_board_errors(board) + array_board_errors(dead_board)
+    if errors:
+        return {name: {'error': 'ArrayBoard differs from engine: ' + '; '.join(errors)} for name in names}
+    operations = [
+        (array_board, lambda state: state.capturable_mask()),
+        (array_dead_board, lambda state: state.capturable_mask()),
+        (array_board, lambda state: state.yandex_captures()),
+        (array_dead_board, lambda state: state.empty_count()),
+        (board, ArrayBoard.from_board),
+    ]
+    return {name: measure(lambda: state, operation, repeat) for name, (state, operation) in zip(names, operations)}
+
+
+def array_board_errors(board):
+    side_size = board.side_size
+    array_board = ArrayBoard.from_board(board)
+    errors = []
+    capturable = set(array_board.cells(array_board.capturable_mask()))
+    expected = {(x, y) for y in range(side_size) for x in range(side_size) if board.is_cell_can_be_captured(x, y)}
+    if capturable != expected:
+        errors.append(f'capturable cells of {type(board).__name__}[{side_size}]')
+    if array_board.empty_count() != len(board.free_cells):
+        errors.append(f'empty count of {type(board).__name__}[{side_size}]')
+    if array_board.is_win() != bool(board.is_win()):
+        errors.append(f'is_win of {type(board).__name__}[{side_size}]')
+    if not expected:
+        return errors
+    # клетки, которые забрал "Яндекс", - ничьи и мёртвые клетки, ставшие клетками игрока
+    yandex_board = with_cell(board, YandexCell)
+    array_board = ArrayBoard.from_board(yandex_board)
+    captures = set(array_board.cells(array_board.yandex_captures()))
+    before = [[cell.direction for cell in row] for row in yandex_board.table]
+    direction = yandex_board.current_direction
+    activate_last(yandex_board, YandexCell)
+    expected = {(x, y) for y in range(side_size) for x in range(side_size)
+                if before[y][x] in (Direction.NOBODY, Direction.NONE)
+                and yandex_board.table[y][x].direction == direction}
+    if captures != expected:
+        errors.append(f'Yandex captures of {type(board).__name__}[{side_size}]')
+    return errors
+
+
+def make_unmake(board, move: tuple):
+    board.make_move(move)
+    board.unmake_move()
+
+
+def activate_last(board, cell_type):
+    for y, row in enumerate(board.table):
+        for x, cell in enumerate(row):
+            if type(cell) == cell_type:
+                board.activate(x, y)
+                return None
+
+
+def render_benchmark(side_size: int, repeat: int):
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    import pygame
+    from main import create_view
+    screen = pygame.display.set_mode((1920, 1080))
+    background = pygame.Surface(screen.get_size())
+    view = create_view(filled_board(side_size), screen.get_size())
+
+    def full_frame(state):
+        view.repaint_rect(screen.get_rect())
+        view.draw(screen, background)
+    return measure(lambda: view, full_frame, repeat)
+
+
+def run(repeat: int, render: bool):
+    results = {}
+    for side_size in sizes:
+        for name, result in board_benchmarks(side_size, repeat).items():
+            results[f'{name}[{side_size}]'] = result
+    if render:
+        for side_size in render_sizes:
+            results[f'render[{side_size}]'] = render_benchmark(side_size, repeat)
+    return results
+
+
+def format_result(result: dict):
+    if 'error' in result:
+        return result['error']
+    return f'{result["median_us"]:12.1f} us'
+
+
+def compare(results: dict, baseline: dict, threshold: float):
+    # возвращает True, если ни один замер не стал медленнее больше чем на threshold
+    is_ok = True
+    for name, result in results.items():
+        if 'error' in result:
+            is_ok = False
+            print(f'{name:40} {format_result(result)}')
+            continue
+        if name not in baseline or 'error' in baseline[name]:
+            print(f'{name:40} {format_result(result)}  (new)')
+            continue
+        ratio = result['median_us'] / baseline[name]['median_us']
+        mark = 'SLOWER' if ratio > 1 + threshold else ''
+        if mark:
+            is_ok = False
+        print(f'{name:40} {format_result(result)}  x{ratio:.2f} {mark}')
+    return is_ok
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description='Board and rendering benchmarks')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--output', help='save results as a JSON baseline')
+    parser.add_argument('--compare', help='baseline JSON to compare with')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed slowdown, 0.2 = 20%%')
+    parser.add_argument('--no-render', action='store_true', help='skip pygame rendering benchmarks')
+    args = parser.parse_args(arguments)
+
+    results = run(args.repeat, not args.no_render)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        if not compare(results, baseline, args.threshold):
+            sys.exit(1)
+    elif not args.output:
+        for name, result in results.items():
+            print(f'{name:40} {format_result(result)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,671 @@
+from abc import ABC, abstractmethod
+from array import array
+from enum import Enum
+from itertools import accumulate
+import copy
+import random
+
+
+# игровая логика без pygame: поле, клетки и ходы для всех режимов
+class Direction(Enum):
+    NONE = 0
+    NOBODY = 1
+    ORANGE = 2
+    BLUE = 3
+
+    # владельцы - ключи словарей поля при каждой записи клетки; значения перечисления
+    # единственны, поэтому хэш по объекту верен и не вызывает Enum.__hash__
+    __hash__ = object.__hash__
+
+
+directions = [Direction.BLUE, Direction.ORANGE]
+
+
+def opponent(direction: Direction):
+    return directions[(directions.index(direction) + 1) % 2]
+
+
+# таблицы соседей строятся один раз для каждого размера поля:
+# по индексу y * side_size + x лежат координаты соседей клетки
+adjacency_tables = {}
+
+
+def get_adjacency(side_size: int):
+    if side_size not in adjacency_tables:
+        table = []
+        for y in range(side_size):
+            for x in range(side_size):
+                neighbors = [(x, y + 1), (x, y - 1), (x + 1, y), (x - 1, y)]
+                table.append(tuple((neighbor_x, neighbor_y) for neighbor_x, neighbor_y in neighbors
+                                   if 0 <= neighbor_x < side_size and 0 <= neighbor_y < side_size))
+        adjacency_tables[side_size] = table
+    return adjacency_tables[side_size]
+
+
+# допустимые пары координат столиц по одной оси: (первая, вторая) с разницей больше distance
+capital_pairs = {}
+
+
+def get_capital_pairs(side_size: int, distance: int):
+    key = (side_size, distance)
+    if key not in capital_pairs:
+        capital_pairs[key] = [(first, second) for first in range(side_size) for second in range(side_size)
+                              if abs(first - second) > distance]
+    return capital_pairs[key]
+
+
+# клетки неизменяемые и общие для всех полей: одна клетка на (вид, владелец), а у
+# "изменяющейся клетки" ещё на маску, см. get_cell. Положение клетки - её место в таблице
+# поля, поэтому методам клеток поле и координаты передаются параметрами
+class DefaultCell(ABC):
+    __slots__ = ('direction',)
+
+    def __init__(self, direction: Direction):
+        object.__setattr__(self, 'direction', direction)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'{type(self).__name__} is shared between boards and cannot be changed')
+
+    def __reduce__(self):
+        # копирование и pickle возвращают ту же общую клетку
+        return get_cell, (type(self), self.direction)
+
+    @classmethod
+    def create(cls, board, direction: Direction):
+        # клетка этого вида, которую игрок ставит на поле
+        return get_cell(cls, direction)
+
+
+# класс уничтожающейся клетки в режиме "Death"
+class DeadCell(DefaultCell):
+    __slots__ = ()
+
+
+class EmptyCell(DefaultCell):
+    __slots__ = ()
+
+
+# класс столиц
+class CapitalCell(DefaultCell):
+    __slots__ = ()
+
+
+class ClickableCell(DefaultCell):
+    __slots__ = ()
+
+    @abstractmethod
+    def activate(self, board, x: int, y: int):
+        pass
+
+
+# класс, отвечающий за появление случайной клетки
+class RandomCell(ClickableCell):
+    __slots__ = ()
+
+    def activate(self, board, x: int, y: int):
+        if board.current_direction != self.direction:
+            return False
+        current_variant = board.spawn_table.choose(board.random, first=2)
+        board.set_cell(x, y, current_variant.create(board, self.direction))
+        board.change_current_direction()
+        return True
+
+
+# класс клетки бомбы
+class BombCell(ClickableCell):
+    __slots__ = ()
+
+    def activate(self, board, x: int, y: int):
+        if board.current_direction != self.direction:
+            return False
+        empty = get_cell(EmptyCell, self.direction)
+        for neighbor_x, neighbor_y in board.neighbors(x, y):
+            if type(board.table[neighbor_y][neighbor_x]) == CapitalCell:
+                continue
+            board.notify('bomb', neighbor_x, neighbor_y)
+            board.set_cell(neighbor_x, neighbor_y, empty)
+        board.set_cell(x, y, empty)
+        board.change_current_direction()
+        return True
+
+
+class ProtectedCell(DefaultCell):
+    __slots__ = ()
+
+
+# класс клетки башни
+class TowerCell(ProtectedCell):
+    __slots__ = ()
+
+
+# класс клетки "Яндекс"
+class YandexCell(ClickableCell, ProtectedCell):
+    __slots__ = ()
+
+    def activate(self, board, x: int, y: int):
+        if board.current_direction != self.direction:
+            return False
+        # захватываются ничьи и мёртвые клетки рядом с клетками игрока, то есть его граница;
+        # порядок поля сохраняется, чтобы порядок ничьих клеток был как при обходе всего поля
+        board.notify('rook', x, y)
+        yandexed = []
+        for index in sorted(board.frontier[self.direction]):
+            cell_x, cell_y = index % board.side_size, index // board.side_size
+            cell = board.table[cell_y][cell_x]
+            if (cell.direction == Direction.NOBODY or cell.direction == Direction.NONE) and type(cell) != CapitalCell:
+                yandexed.append((cell_x, cell_y))
+        empty = get_cell(EmptyCell, self.direction)
+        for yandexed_x, yandexed_y in yandexed:
+            board.set_cell(yandexed_x, yandexed_y, empty)
+        board.set_cell(x, y, empty)
+        board.change_current_direction()
+        return True
+
+
+# класс, описывающий "изменяющюся клетку" в игре
+class TurnCell(DefaultCell):
+    __slots__ = ()
+
+    @abstractmethod
+    def on_turn_changed(self, board, x: int, y: int):
+        pass
+
+
+class ChangedCell(TurnCell):
+    # mask_cell - общая клетка вида маски; до первой смены маски игроки
+    # видят только "изменяющуюся клетку"
+    __slots__ = ('mask_cell', 'is_revealed')
+
+    def __init__(self, direction: Direction, mask=EmptyCell, is_revealed: bool = False):
+        super().__init__(direction)
+        object.__setattr__(self, 'mask_cell', get_cell(mask, direction))
+        object.__setattr__(self, 'is_revealed', is_revealed)
+
+    def __reduce__(self):
+        return get_cell, (ChangedCell, self.direction, type(self.mask_cell), self.is_revealed)
+
+    @classmethod
+    def create(cls, board, direction: Direction):
+        mask_type = board.spawn_table.choose(board.random, first=1)
+        return get_cell(ChangedCell, direction, mask_type)
+
+    def on_turn_changed(self, board, x: int, y: int):
+        # смена маски - замена клетки на клетку с другой маской
+        if board.current_direction != self.direction:
+            return None
+        mask_type = board.spawn_table.choose(board.random, first=2)
+        board.set_cell(x, y, get_cell(ChangedCell, self.direction, mask_type, True))
+
+
+shared_cells = {}
+
+
+def get_cell(kind, direction: Direction, mask=None, is_revealed: bool = False):
+    # mask и is_revealed - только для ChangedCell, маска по умолчанию - пустая клетка,
+    # как в ChangedCell.__init__, чтобы у одной клетки был один ключ
+    if kind == ChangedCell:
+        mask = mask or EmptyCell
+    key = (kind, direction, mask, is_revealed)
+    cell = shared_cells.get(key)
+    if cell is None:
+        cell = kind(direction, mask, is_revealed) if kind == ChangedCell else kind(direction)
+        shared_cells[key] = cell
+    return cell
+
+
+# ходы в истории партии: (MOVE_ADD, index, x, y), (MOVE_ACTIVATE, x, y), (MOVE_PASS,);
+# по seed поля и истории партия восстанавливается полностью
+MOVE_ADD = 'add'
+MOVE_ACTIVATE = 'activate'
+MOVE_PASS = 'pass'
+# позиция занятой клетки в массиве ничьих клеток
+NOT_FREE = -1
+
+all_cells = [ChangedCell, RandomCell, EmptyCell, TowerCell, BombCell, YandexCell]
+all_cells_chances = [0.5, 0.3, 0, 0.3, 0.3, 0.6]
+
+
+# веса появления клеток all_cells: для клеток added, случайной клетки (с третьего вида)
+# и масок "изменяющейся клетки" (со второго). Без весов выбор равновероятный, как в первых
+# версиях игры, - так проигрываются старые записи партий
+class SpawnTable:
+    def __init__(self, weights=None):
+        if weights is not None:
+            weights = tuple(weights)
+            if len(weights) != len(all_cells) or min(weights) < 0:
+                raise ValueError(f'spawn table needs {len(all_cells)} non-negative weights, got {weights}')
+            if sum(weights[2:]) <= 0:
+                raise ValueError('at least one of the cells after RandomCell must have a positive weight')
+        self.weights = weights
+        # накопленные веса для каждого first считаются один раз, а не при каждом выборе;
+        # choices с cum_weights выбирает так же, как с weights
+        self.cum_weights = None
+        if weights is not None:
+            self.cum_weights = [list(accumulate(weights[first:])) for first in range(len(all_cells))]
+
+    def choose(self, generator: random.Random, first: int = 0):
+        if self.weights is None:
+            return generator.choice(all_cells[first:])
+        return generator.choices(all_cells[first:], cum_weights=self.cum_weights[first])[0]
+
+
+default_spawn_table = SpawnTable(all_cells_chances)
+uniform_spawn_table = SpawnTable()
+
+# коды видов клеток для компактной записи поля: сеть, массивы, сохранения
+cell_kinds = [EmptyCell, DeadCell, CapitalCell, ChangedCell, RandomCell, TowerCell, BombCell, YandexCell]
+kind_codes = {kind: code for code, kind in enumerate(cell_kinds)}
+# виды клеток из реестров поля; проверка по множеству быстрее isinstance с ABC
+turn_kinds = frozenset(kind for kind in cell_kinds if issubclass(kind, TurnCell))
+clickable_kinds = frozenset(kind for kind in cell_kinds if issubclass(kind, ClickableCell))
+NO_MASK = -1
+
+
+# ключи Зобриста для хэша позиции. Ключи не хранятся в таблицах, а вычисляются
+# перемешиванием splitmix64 из номера клетки и кода (вид, владелец) или маски,
+# поэтому большие поля не требуют памяти под ключи
+MASK_64 = (1 << 64) - 1
+KEYS_PER_CELL = 64
+BLUE_TO_MOVE_KEY = 1 << 62
+
+
+def zobrist_key(number: int):
+    number = (number + 0x9E3779B97F4A7C15) & MASK_64
+    number = ((number ^ (number >> 30)) * 0xBF58476D1CE4E5B9) & MASK_64
+    number = ((number ^ (number >> 27)) * 0x94D049BB133111EB) & MASK_64
+    return number ^ (number >> 31)
+
+
+# коды клеток для ключей: (вид и владелец, вид маски или None). Клетки общие,
+# поэтому коды считаются один раз на клетку, а не при каждой записи в поле
+cell_codes = {}
+
+
+def cell_key(index: int, cell: DefaultCell):
+    codes = cell_codes.get(cell)
+    if codes is None:
+        mask_code = kind_codes[type(cell.mask_cell)] if type(cell) == ChangedCell else None
+        codes = cell_codes[cell] = (kind_codes[type(cell)] * len(Direction) + cell.direction.value, mask_code)
+    key = zobrist_key(index * KEYS_PER_CELL + codes[0])
+    if codes[1] is not None:
+        key ^= zobrist_key(index * KEYS_PER_CELL + 32 + codes[1])
+    return key
+
+
+# хэш пустого поля для каждого размера
+empty_board_hashes = {}
+
+
+def get_empty_board_hash(side_size: int):
+    if side_size not in empty_board_hashes:
+        code = kind_codes[EmptyCell] * len(Direction) + Direction.NOBODY.value
+        board_hash = 0
+        for index in range(side_size * side_size):
+            board_hash ^= zobrist_key(index * KEYS_PER_CELL + code)
+        empty_board_hashes[side_size] = board_hash
+    return empty_board_hashes[side_size]
+
+
+def encode_cell(cell: DefaultCell, is_hidden_mask_shown: bool = True):
+    # (вид, владелец, маска); маска ChangedCell до раскрытия отдаётся только по запросу
+    mask = NO_MASK
+    if type(cell) == ChangedCell and (cell.is_revealed or is_hidden_mask_shown):
+        mask = kind_codes[type(cell.mask_cell)]
+    return kind_codes[type(cell)], cell.direction.value, mask
+
+
+# класс поля в стандартном режиме
+class DefaultBoard:
+    def __init__(self, side_size: int, seed=None, spawn_table: SpawnTable = None):
+        self.side_size = side_size
+        # все случайные события партии берутся из своего генератора,
+        # поэтому партия с тем же seed повторяется полностью
+        self.seed = seed
+        self.random = random.Random(seed)
+        self.spawn_table = spawn_table or default_spawn_table
+        # подписчики на события поля: listener(event, x, y)
+        self.listeners = []
+        self.adjacency = get_adjacency(side_size)
+        # граница игрока: индекс клетки -> число соседних клеток этого игрока;
+        # захватить можно только клетку из границы текущего игрока
+        self.frontier = {direction: {} for direction in directions}
+        # ничьи клетки: массив индексов и позиция каждого индекса в нём (NOT_FREE - клетка
+        # занята), чтобы выбирать случайную клетку и удалять её за O(1)
+        self.free_cells = array('l', range(side_size * side_size))
+        self.free_positions = array('l', self.free_cells)
+        # 64-битный хэш позиции, обновляется при каждом изменении поля
+        self.hash = get_empty_board_hash(side_size)
+        # клетки, реагирующие на смену хода (индекс -> клетка), и число живых столиц
+        # каждого игрока; ведутся в set_cell, чтобы не обходить поле каждый ход и кадр
+        self.turn_cells = {}
+        self.clickable_cells = {}
+        self.capitals = {direction: 0 for direction in directions}
+        # число клеток каждого владельца, для быстрой оценки позиции без обхода поля
+        self.cell_counts = dict.fromkeys(Direction, 0)
+        self.cell_counts[Direction.NOBODY] = side_size * side_size
+        # отмена ходов make_move: состояние перед каждым ходом и журнал изменений клеток,
+        # журнал ведётся, только пока есть неотменённые ходы. Состояние генератора
+        # (625 чисел) копируется один раз, перед первым ходом стека
+        self.undo_stack = []
+        self.journal = []
+        self.base_random_state = None
+        empty = get_cell(EmptyCell, Direction.NOBODY)
+        self.table = [[empty] * side_size for _ in range(side_size)]
+        self.create_capitals(distance=max(0, min(3, side_size - 2)))
+        self.current_direction = Direction.ORANGE
+        self.added = self.create_added()
+        self.winner = None
+        self.turn_number = 0
+        self.history = []
+
+    def clone(self, seed=None):
+        # независимая копия поля без подписчиков, например для перебора ходов;
+        # у копии свой генератор, чтобы не сдвигать случайность настоящей партии
+        board = copy.copy(self)
+        board.random = random.Random(seed)
+        board.listeners = []
+        board.history = []
+        board.frontier = {direction: dict(counts) for direction, counts in self.frontier.items()}
+        board.free_cells = array('l', self.free_cells)
+        board.free_positions = array('l', self.free_positions)
+        # клетки общие, копируются только строки таблицы
+        board.table = [list(row) for row in self.table]
+        board.turn_cells = dict(self.turn_cells)
+        board.clickable_cells = dict(self.clickable_cells)
+        board.undo_stack = []
+        board.journal = []
+        board.base_random_state = None
+        board.capitals = dict(self.capitals)
+        board.cell_counts = dict(self.cell_counts)
+        board.added = list(self.added)
+        return board
+
+    def notify(self, event: str, x: int = -1, y: int = -1):
+        for listener in self.listeners:
+            listener(event, x, y)
+
+    def cell_hash(self, x: int, y: int):
+        return cell_key(y * self.side_size + x, self.table[y][x])
+
+    def set_cell(self, x: int, y: int, cell: DefaultCell):
+        index = y * self.side_size + x
+        old_direction = self.table[y][x].direction
+        if self.undo_stack:
+            self.journal.append((x, y, self.table[y][x], self.free_positions[index]))
+        self.replace_cell(x, y, cell)
+        if old_direction != cell.direction:
+            if old_direction == Direction.NOBODY:
+                self.remove_free_cell(index)
+            elif cell.direction == Direction.NOBODY:
+                self.add_free_cell(index)
+        self.notify('cell', x, y)
+
+    def replace_cell(self, x: int, y: int, cell: DefaultCell):
+        # запись в таблицу с обновлением хэша, реестров клеток и границ; ничьи клетки
+        # обновляет вызывающий, потому что отмена хода восстанавливает их порядок точно
+        old_cell = self.table[y][x]
+        old_hash = self.cell_hash(x, y)
+        self.table[y][x] = cell
+        self.hash ^= old_hash ^ self.cell_hash(x, y)
+        index = y * self.side_size + x
+        for registry, kinds in ((self.turn_cells, turn_kinds), (self.clickable_cells, clickable_kinds)):
+            if type(old_cell) in kinds:
+                del registry[index]
+            if type(cell) in kinds:
+                registry[index] = cell
+        if type(old_cell) == CapitalCell:
+            self.capitals[old_cell.direction] -= 1
+        if type(cell) == CapitalCell:
+            self.capitals[cell.direction] += 1
+        if old_cell.direction != cell.direction:
+            self.cell_counts[old_cell.direction] -= 1
+            self.cell_counts[cell.direction] += 1
+            old_frontier = self.frontier.get(old_cell.direction)
+            new_frontier = self.frontier.get(cell.direction)
+            for neighbor_x, neighbor_y in self.neighbors(x, y):
+                neighbor = neighbor_y * self.side_size + neighbor_x
+                if old_frontier is not None:
+                    self.update_frontier(old_frontier, neighbor, -1)
+                if new_frontier is not None:
+                    self.update_frontier(new_frontier, neighbor, 1)
+
+    def update_frontier(self, counts: dict, index: int, delta: int):
+        count = counts.get(index, 0) + delta
+        if count:
+            counts[index] = count
+        else:
+            del counts[index]
+
+    def add_free_cell(self, index: int):
+        self.free_positions[index] = len(self.free_cells)
+        self.free_cells.append(index)
+
+    def remove_free_cell(self, index: int):
+        # на место удаляемого индекса встаёт последний
+        position = self.free_positions[index]
+        self.free_positions[index] = NOT_FREE
+        last = self.free_cells.pop()
+        if last != index:
+            self.free_cells[position] = last
+            self.free_positions[last] = position
+
+    def restore_free_cell(self, index: int, position: int):
+        # обратное к remove_free_cell: индекс возвращается на прежнее место
+        if position < len(self.free_cells):
+            moved = self.free_cells[position]
+            self.free_positions[moved] = len(self.free_cells)
+            self.free_cells.append(moved)
+            self.free_cells[position] = index
+        else:
+            self.free_cells.append(index)
+        self.free_positions[index] = position
+
+    def is_on_frontier(self, x: int, y: int):
+        return y * self.side_size + x in self.frontier[self.current_direction]
+
+    def neighbors(self, x: int, y: int):
+        return self.adjacency[y * self.side_size + x]
+
+    def capturable_cells(self):
+        # все клетки, куда текущий игрок может поставить новую клетку
+        cells = []
+        for index in self.frontier[self.current_direction]:
+            x, y = index % self.side_size, index // self.side_size
+            if self.is_cell_can_be_captured(x, y):
+                cells.append((x, y))
+        return cells
+
+    def create_added(self):
+        # три клетки, которые текущий игрок может поставить на поле
+        return [self.spawn_table.choose(self.random) for _ in range(3)]
+
+    def is_win(self):
+        is_blue_capital_alive = self.capitals[Direction.BLUE] > 0
+        is_orange_capital_alive = self.capitals[Direction.ORANGE] > 0
+        if is_orange_capital_alive and is_blue_capital_alive:
+            return None
+        else:
+            if is_orange_capital_alive:
+                self.winner = Direction.ORANGE
+            else:
+                self.winner = Direction.BLUE
+            return True
+
+    def change_current_direction(self):
+        # смена хода одна для всех режимов, режимы дополняют её через
+        # before_turn_change и after_turn_change
+        self.before_turn_change()
+        # клетки обходятся в порядке поля, как при полном обходе, чтобы
+        # случайные маски выпадали так же и старые записи партий не расходились
+        for index in sorted(self.turn_cells):
+            self.turn_cells[index].on_turn_changed(self, index % self.side_size, index // self.side_size)
+        self.current_direction = opponent(self.current_direction)
+        self.hash ^= zobrist_key(BLUE_TO_MOVE_KEY)
+        self.added = self.create_added()
+        self.turn_number += 1
+        self.after_turn_change()
+        self.notify('turn')
+
+    def before_turn_change(self):
+        pass
+
+    def after_turn_change(self):
+        pass
+
+    def create_capitals(self, distance: int):
+        # столицы дальше distance друг от друга по обеим осям; пары выбираются
+        # сразу из допустимых, а не перебором случайных клеток
+        pairs = get_capital_pairs(self.side_size, distance)
+        if not pairs:
+            raise ValueError(f'capitals at distance {distance} do not fit on a board of side {self.side_size}')
+        first_x, second_x = self.random.choice(pairs)
+        first_y, second_y = self.random.choice(pairs)
+        self.set_cell(first_x, first_y, get_cell(CapitalCell, Direction.BLUE))
+        self.set_cell(second_x, second_y, get_cell(CapitalCell, Direction.ORANGE))
+
+    def is_cell_can_be_captured(self, x: int, y: int):
+        if not self.is_on_frontier(x, y):
+            return False
+        if self.table[y][x].direction == self.current_direction and type(self.table[y][x]) != EmptyCell:
+            return False
+        if self.table[y][x].direction == opponent(self.current_direction):
+            if issubclass(type(self.table[y][x]), ProtectedCell):
+                return False
+        return True
+
+    def add_new_cell(self, index: int, x: int, y: int):
+        # ставит клетку added[index] в (x, y), если это разрешено правилами
+        if not self.is_cell_can_be_captured(x, y):
+            return False
+        self.history.append((MOVE_ADD, index, x, y))
+        self.set_cell(x, y, self.added[index].create(self, self.current_direction))
+        self.change_current_direction()
+        return True
+
+    def activate(self, x: int, y: int):
+        # нажатие на клетку: бомба, "Яндекс", случайная или замаскированная под них
+        cell = self.table[y][x]
+        if type(cell) == ChangedCell:
+            cell = cell.mask_cell
+        if not issubclass(type(cell), ClickableCell) or cell.direction != self.current_direction:
+            return False
+        self.history.append((MOVE_ACTIVATE, x, y))
+        return cell.activate(self, x, y)
+
+    def pass_turn(self):
+        # ход переходит без действия: истёк таймер или ходить некуда
+        self.history.append((MOVE_PASS,))
+        self.change_current_direction()
+
+    def apply_move(self, move: tuple):
+        if move[0] == MOVE_ADD:
+            return self.add_new_cell(*move[1:])
+        if move[0] == MOVE_ACTIVATE:
+            return self.activate(*move[1:])
+        self.pass_turn()
+        return True
+
+    def legal_moves(self):
+        # все ходы текущего игрока в формате истории: каждая из разных клеток added
+        # в каждую клетку, которую можно захватить, и нажатия на свои клетки
+        moves = []
+        capturable = self.capturable_cells()
+        for index, cell_type in enumerate(self.added):
+            if cell_type not in self.added[:index]:
+                moves.extend((MOVE_ADD, index, x, y) for x, y in capturable)
+        for index in sorted(self.clickable_cells.keys() | self.turn_cells.keys()):
+            cell = self.table[index // self.side_size][index % self.side_size]
+            if type(cell) == ChangedCell:
+                cell = cell.mask_cell
+            if isinstance(cell, ClickableCell) and cell.direction == self.current_direction:
+                moves.append((MOVE_ACTIVATE, index % self.side_size, index // self.side_size))
+        return moves
+
+    def save_state(self):
+        return self.current_direction, self.added, self.turn_number, self.hash, self.winner, len(self.history)
+
+    def restore_state(self, state: tuple):
+        self.current_direction, self.added, self.turn_number, self.hash, self.winner, history_length = state
+        del self.history[history_length:]
+
+    def make_move(self, move: tuple):
+        # ход, который можно отменить unmake_move; недопустимый ход ничего не меняет
+        if not self.undo_stack:
+            self.base_random_state = self.random.getstate()
+        self.undo_stack.append((self.save_state(), len(self.journal)))
+        if not self.apply_move(move):
+            self.undo_stack.pop()
+            return False
+        return True
+
+    def unmake_move(self):
+        # прежние клетки возвращаются в обратном порядке, а вместе с ними границы,
+        # реестры и порядок ничьих клеток; затем состояние хода. Генератор возвращается
+        # только при отмене последнего хода стека: отмена хода в середине стека оставляет
+        # генератор как есть, и следующие ходы вытянут другие случайные клетки
+        state, journal_length = self.undo_stack.pop()
+        while len(self.journal) > journal_length:
+            x, y, old_cell, free_position = self.journal.pop()
+            current_direction = self.table[y][x].direction
+            self.replace_cell(x, y, old_cell)
+            if current_direction != old_cell.direction:
+                if old_cell.direction == Direction.NOBODY:
+                    self.restore_free_cell(y * self.side_size + x, free_position)
+                elif current_direction == Direction.NOBODY:
+                    self.free_positions[self.free_cells.pop()] = NOT_FREE
+            self.notify('cell', x, y)
+        self.restore_state(state)
+        if not self.undo_stack:
+            self.random.setstate(self.base_random_state)
+        self.notify('turn')
+
+
+# класс поля в режиме блитц
+class BlitzBoard(DefaultBoard):
+    def __init__(self, side_size: int, seed=None, spawn_table: SpawnTable = None):
+        super().__init__(side_size, seed, spawn_table)
+        self.timer = 5
+
+    def after_turn_change(self):
+        self.timer = 5
+
+    def save_state(self):
+        return super().save_state(), self.timer
+
+    def restore_state(self, state: tuple):
+        state, self.timer = state
+        super().restore_state(state)
+
+    def tick(self):
+        # вызывается раз в секунду; через две секунды после нуля ход переходит
+        self.timer -= 1
+        if self.timer == -2:
+            self.pass_turn()
+
+
+# класс поля в режиме "Death"
+class DeadBoard(DefaultBoard):
+    def before_turn_change(self):
+        self.delete_cell()
+
+    def is_cell_can_be_captured(self, x: int, y: int):
+        if not self.is_on_frontier(x, y):
+            return False
+        if type(self.table[y][x]) == DeadCell:
+            return False
+        if self.table[y][x].direction == opponent(self.current_direction):
+            if issubclass(type(self.table[y][x]), ProtectedCell):
+                return False
+        return True
+
+    def delete_cell(self):
+        # уничтожает случайную ничью клетку; False, если таких не осталось
+        if not self.free_cells:
+            return False
+        index = self.random.choice(self.free_cells)
+        x, y = index % self.side_size, index // self.side_size
+        self.set_cell(x, y, get_cell(DeadCell, Direction.NONE))
+        return True
+
+
+all_game_modes = [DefaultBoard, DeadBoard, BlitzBoard]
@@ -0,0 +1,124 @@
+from array import array
+
+from engine import Direction, opponent, DeadBoard, ChangedCell, ProtectedCell, cell_kinds, kind_codes, NO_MASK
+
+
+# компактное поле на массивах: вид клетки и владелец хранятся кодами по байту на клетку
+# (индекс y * side_size + x), правила считаются над масками всего поля. Маска - целое
+# число, в котором клетке отведён свой байт со значением 0 или 1, поэтому &, | и сдвиги
+# обрабатывают всё поле за одну операцию, а не циклом по клеткам
+EMPTY, DEAD, CAPITAL, CHANGED, RANDOM, TOWER, BOMB, YANDEX = range(len(cell_kinds))
+CELL_BITS = 8
+
+
+# таблицы для bytes.translate: код из codes -> 1, остальные -> 0
+code_tables = {}
+
+
+def code_table(codes):
+    codes = tuple(codes)
+    if codes not in code_tables:
+        code_tables[codes] = bytes(int(code in codes) for code in range(256))
+    return code_tables[codes]
+
+
+protected_codes = code_table([code for code, kind in enumerate(cell_kinds) if issubclass(kind, ProtectedCell)])
+
+# маски всего поля и крайних столбцов для каждого размера
+edge_masks = {}
+
+
+def get_edge_masks(side_size: int):
+    if side_size not in edge_masks:
+        full = int.from_bytes(b'\x01' * side_size * side_size, 'little')
+        first_column = int.from_bytes((b'\x01' + bytes(side_size - 1)) * side_size, 'little')
+        last_column = first_column << CELL_BITS * (side_size - 1)
+        edge_masks[side_size] = full, first_column, last_column
+    return edge_masks[side_size]
+
+
+def neighbor_mask(mask: int, side_size: int):
+    # клетки, у которых хотя бы один сосед по стороне попал в mask; сдвиг на клетку
+    # убирает переход через край строки, сдвиг на строку - выход за поле
+    full, first_column, last_column = get_edge_masks(side_size)
+    row_shift = CELL_BITS * side_size
+    result = (mask << CELL_BITS) & ~first_column | (mask >> CELL_BITS) & ~last_column
+    result |= (mask << row_shift) | (mask >> row_shift)
+    return result & full
+
+
+class ArrayBoard:
+    def __init__(self, side_size: int, is_death: bool = False):
+        self.side_size = side_size
+        self.is_death = is_death
+        self.kinds = bytearray([EMPTY]) * (side_size * side_size)
+        self.owners = bytearray([Direction.NOBODY.value]) * (side_size * side_size)
+        # вид клетки, под которую замаскирована ChangedCell
+        self.masks = array('b', [NO_MASK]) * (side_size * side_size)
+        self.current_direction = Direction.ORANGE
+
+    @classmethod
+    def from_board(cls, board):
+        array_board = cls(board.side_size, is_death=isinstance(board, DeadBoard))
+        for y, row in enumerate(board.table):
+            for x, cell in enumerate(row):
+                array_board.set_cell(x, y, type(cell), cell.direction)
+                if type(cell) == ChangedCell:
+                    array_board.masks[y * board.side_size + x] = kind_codes[type(cell.mask_cell)]
+        array_board.current_direction = board.current_direction
+        return array_board
+
+    def set_cell(self, x: int, y: int, kind, direction: Direction):
+        index = y * self.side_size + x
+        self.kinds[index] = kind_codes[kind]
+        self.owners[index] = direction.value
+        self.masks[index] = NO_MASK
+
+    def select(self, layer: bytearray, codes):
+        return int.from_bytes(layer.translate(code_table(codes)), 'little')
+
+    def owned_mask(self, direction: Direction):
+        return self.select(self.owners, [direction.value])
+
+    def kind_mask(self, kind_code: int):
+        return self.select(self.kinds, [kind_code])
+
+    def capturable_mask(self, direction: Direction = None):
+        # то же, что is_cell_can_be_captured, сразу для всего поля
+        direction = direction or self.current_direction
+        own = self.owned_mask(direction)
+        protected = int.from_bytes(self.kinds.translate(protected_codes), 'little')
+        enemy_protected = self.owned_mask(opponent(direction)) & protected
+        if self.is_death:
+            blocked = self.kind_mask(DEAD)
+        else:
+            blocked = own & ~self.kind_mask(EMPTY)
+        return neighbor_mask(own, self.side_size) & ~blocked & ~enemy_protected
+
+    def capitals_alive(self):
+        capitals = self.kind_mask(CAPITAL)
+        is_orange_alive = bool(capitals & self.owned_mask(Direction.ORANGE))
+        is_blue_alive = bool(capitals & self.owned_mask(Direction.BLUE))
+        return is_orange_alive, is_blue_alive
+
+    def is_win(self):
+        return not all(self.capitals_alive())
+
+    def yandex_captures(self, direction: Direction = None):
+        # ничьи и мёртвые клетки рядом с клетками игрока, которые заберёт "Яндекс"
+        direction = direction or self.current_direction
+        free = self.select(self.owners, [Direction.NOBODY.value, Direction.NONE.value])
+        return free & ~self.kind_mask(CAPITAL) & neighbor_mask(self.owned_mask(direction), self.side_size)
+
+    def empty_count(self):
+        return self.owned_mask(Direction.NOBODY).bit_count()
+
+    def cells(self, mask: int):
+        # координаты клеток маски по порядку поля
+        data = mask.to_bytes(self.side_size * self.side_size, 'little')
+        result = []
+        index = data.find(1)
+        while index != -1:
+            result.append((index % self.side_size, index // self.side_size))
+            index = data.find(1, index + 1)
+        return result
@@ -1,484 +1,659 @@
-from abc import ABC, abstractmethod
-from enum import Enum
+from collections import OrderedDict
+import argparse
+import heapq
+import itertools
 import random
+import struct
+import threading
+import time
 import pygame
 import os
 
-pygame.init()
+from ai import ComputerPlayer
+from audio import SoundManager
+from engine import Direction, DefaultBoard, BlitzBoard, DeadBoard, DeadCell, ChangedCell, all_game_modes
+from profiler import profiler
+from replay import ReplayRecorder, load_game
+from snapshot import SnapshotFile, save_snapshot
 
-cell_sprites = pygame.sprite.Group()
+pygame.init()
 
-# загрузка звуков
 sound_dir = os.path.join(os.path.dirname(__file__), 'sounds')
-bomb_sound = pygame.mixer.Sound(os.path.join(sound_dir, 'bomb.wav'))
-bomb_sound2 = pygame.mixer.Sound(os.path.join(sound_dir, 'bomb2.wav'))
-rook_sound = pygame.mixer.Sound(os.path.join(sound_dir, 'rook.mp3'))
-# загрузка музыки
-pygame.mixer.music.load(os.path.join(sound_dir, 'fon_music.mp3'))
-pygame.mixer.music.set_volume(0.2)
+image_dir = os.path.join(os.path.dirname(__file__), 'images')
+sound_names = ['bomb.wav', 'bomb2.wav', 'rook.mp3']
+# картинки меню загружаются первыми
+menu_image_names = ['standartGameMode.png', 'DeathGameMode.png', 'BlitzGameMode.png', 'leftButton.png',
+                    'rightButton.png']
+
+
+# фоновая загрузка звуков, музыки и картинок: меню показывается сразу,
+# а готовые ресурсы забираются из loader по мере загрузки
+class AssetLoader:
+    def __init__(self):
+        self.sounds = {}
+        self.decoded = {}
+        self.is_music_ready = False
+        self.loaded = 0
+        self.total = 0
+        self.thread = None
+
+    def start(self, is_audio: bool = True):
+        # без микшера или с mute звуки и музыка не загружаются
+        image_names = menu_image_names + sorted(name for name in os.listdir(image_dir)
+                                                if name.endswith('.png') and name not in menu_image_names)
+        self.total = len(image_names) + (len(sound_names) + 1 if is_audio else 0)
+        self.thread = threading.Thread(target=self.run, args=(image_names, is_audio), daemon=True)
+        self.thread.start()
+
+    def run(self, image_names, is_audio: bool):
+        # ресурс, который не удалось загрузить, тоже считается: картинку потом загрузит
+        # главный поток, а звука просто не будет
+        for name in image_names:
+            # в потоке только декодирование, convert делается в главном потоке;
+            # картинку, которую главный поток уже загрузил сам, пропускаем
+            if (name, -1) not in image_cache:
+                try:
+                    self.decoded[name] = pygame.image.load(os.path.join(image_dir, name))
+                except pygame.error:
+                    pass
+            self.loaded += 1
+        if not is_audio:
+            return None
+        for name in sound_names:
+            try:
+                self.sounds[name] = pygame.mixer.Sound(os.path.join(sound_dir, name))
+            except pygame.error:
+                pass
+            self.loaded += 1
+        try:
+            pygame.mixer.music.load(os.path.join(sound_dir, 'fon_music.mp3'))
+            pygame.mixer.music.set_volume(0.2)
+            self.is_music_ready = True
+        except pygame.error:
+            pass
+        self.loaded += 1
+
+    def is_done(self):
+        return self.total > 0 and self.loaded == self.total
+
 
+assets = AssetLoader()
+# звуки берутся из загрузчика по мере загрузки
+sounds = SoundManager(assets.sounds)
 
-class Direction(Enum):
-    NONE = 0
-    NOBODY = 1
-    ORANGE = 2
-    BLUE = 3
 
+# кэш декодированных картинок и кэш отмасштабированных текстур
+image_cache = {}
+texture_cache = OrderedDict()
+TEXTURE_CACHE_SIZE = 256
 
-# загрузка изображений
+
+# загрузка изображений (каждый файл декодируется с диска только один раз)
 def load_image(name, color_key=0):
-    full_name = os.path.join('images', name)
-    try:
-        image = pygame.image.load(full_name)
-    except pygame.error as message:
-        raise SystemExit(message)
+    key = (name, color_key)
+    if key in image_cache:
+        return image_cache[key]
+    image = assets.decoded.pop(name, None)
+    if image is None:
+        try:
+            image = pygame.image.load(os.path.join(image_dir, name))
+            profiler.count('load_image')
+        except pygame.error as message:
+            raise SystemExit(message)
+    if pygame.display.get_surface() is not None:
+        # приводим к формату экрана, чтобы blit не конвертировал картинку каждый кадр
+        image = image.convert_alpha() if image.get_flags() & pygame.SRCALPHA else image.convert()
     if color_key == -1:
         color_key = image.get_at((0, 0))
         image.set_colorkey(color_key)
+    image_cache[key] = image
     return image
 
 
-class DefaultCell(ABC):
-    def __init__(self, x: int, y: int, direction: Direction, board):
-        self.x = board.left + (board.cell_size + board.cell_distance) * x
-        self.y = board.top + (board.cell_size + board.cell_distance) * y
-        self.table_x = x
-        self.table_y = y
-        self.direction = direction
-        self.board = board
-        self.sprite = None
-
-    def init_image(self, name):
-        if self.sprite:
-            cell_sprites.remove(self.sprite)
-        self.sprite = pygame.sprite.Sprite()
-        self.sprite.image = load_image(f"{name[:-4].lower()}{self.direction.name}.png", color_key=-1)
-        self.sprite.image = pygame.transform.scale(self.sprite.image, (self.board.cell_size, self.board.cell_size))
-        self.sprite.rect = (self.x, self.y)
-        cell_sprites.add(self.sprite)
-
-
-# класс уничтожающейся клетки в режиме "Death"
-class DeadCell(DefaultCell):
-    def __init__(self, x: int, y: int, direction: Direction, board):
-        super().__init__(x, y, direction, board)
-        self.init_image('deadCell')
-
-    def init_image(self, name):
-        if self.sprite:
-            cell_sprites.remove(self.sprite)
-        self.sprite = pygame.sprite.Sprite()
-        self.sprite.image = load_image(f"{name}.png", color_key=-1)
-        self.sprite.image = pygame.transform.scale(self.sprite.image, (self.board.cell_size, self.board.cell_size))
-        self.sprite.rect = (self.x, self.y)
-        cell_sprites.add(self.sprite)
-
-
-class EmptyCell(DefaultCell):
-    def __init__(self, x: int, y: int, direction: Direction, board):
-        super().__init__(x, y, direction, board)
-        self.init_image('EmptyCell')
-
-
-# класс столиц
-class CapitalCell(DefaultCell):
-    def __init__(self, x: int, y: int, direction: Direction, board):
-        super().__init__(x, y, direction, board)
-        self.init_image('CapitalCell')
-
-
-class ClickableCell(DefaultCell):
-    def __init__(self, x: int, y: int, direction: Direction, board):
-        super().__init__(x, y, direction, board)
-        self.is_mouse_down = False
+# готовая текстура нужного размера; старые размеры вытесняются из кэша
+def get_texture(name, size):
+    key = (name, size)
+    texture = texture_cache.get(key)
+    if texture is not None:
+        texture_cache.move_to_end(key)
+        return texture
+    texture = pygame.transform.scale(load_image(name, color_key=-1), size)
+    profiler.count('transform.scale')
+    texture_cache[key] = texture
+    if len(texture_cache) > TEXTURE_CACHE_SIZE:
+        texture_cache.popitem(last=False)
+    return texture
+
+
+# шрифты загружаются один раз на (имя, размер): SysFont ищет шрифт среди системных;
+# готовые надписи хранятся в кэше, пока не вытеснятся более новыми
+TEXT_FONT = 'Times New Romans'
+OVERLAY_FONT = 'Courier New'
+WHITE = (255, 255, 255)
+fonts = {}
+text_cache = OrderedDict()
+TEXT_CACHE_SIZE = 128
+
+
+def get_font(name: str, size: int):
+    key = (name, size)
+    if key not in fonts:
+        fonts[key] = pygame.font.SysFont(name, size)
+        profiler.count('SysFont')
+    return fonts[key]
+
+
+def render_text(name: str, size: int, text: str, color=WHITE):
+    key = (name, size, text, color)
+    surface = text_cache.get(key)
+    if surface is not None:
+        text_cache.move_to_end(key)
+        return surface
+    surface = get_font(name, size).render(text, True, color)
+    profiler.count('font.render')
+    text_cache[key] = surface
+    if len(text_cache) > TEXT_CACHE_SIZE:
+        text_cache.popitem(last=False)
+    return surface
+
+
+def cell_image_name(cell_type, direction: Direction):
+    if cell_type == DeadCell:
+        return 'deadCell.png'
+    return f"{cell_type.__name__[:-4].lower()}{direction.name}.png"
+
+
+# слои спрайтов поля: клетки, значки "изменяющихся клеток", клетки для добавления
+CELL_LAYER = 0
+BADGE_LAYER = 1
+ADDED_LAYER = 2
+
+
+# класс отображения поля: спрайты, перетаскивание и нажатия мышью;
+# перерисовываются только изменившиеся клетки
+class BoardView:
+    def __init__(self, board: DefaultBoard, window_size: tuple):
         self.board = board
+        self.left, self.top, self.cell_distance, self.cell_size = self.set_board(window_size)
+        self.cell_sprites = pygame.sprite.LayeredDirty()
+        # LayeredDirty переходит на перерисовку всего экрана, если draw дольше порога,
+        # а на медленных машинах порог превышается всегда
+        self.cell_sprites.set_timing_threshold(float('inf'))
+        side_range = range(self.board.side_size)
+        self.sprites = [[self.add_sprite(self.cell_position(x, y), CELL_LAYER) for x in side_range]
+                        for y in side_range]
+        self.badges = {}
+        self.added_sprites = [self.add_sprite(self.added_position(index), ADDED_LAYER)
+                              for index in range(len(self.board.added))]
+        # прямоугольники клеток для добавления, по ним ищется нажатие
+        self.added_rects = [pygame.Rect(self.added_position(index), (self.cell_size, self.cell_size))
+                            for index in range(len(self.board.added))]
+        # перетаскиваемая клетка из added и смещение курсора относительно неё
+        self.dragged = None
+        self.drag_x = 0
+        self.drag_y = 0
+        self.diff_x = 0
+        self.diff_y = 0
+        self.pressed = None
+        for y in side_range:
+            for x in side_range:
+                self.refresh_cell(x, y)
+        self.refresh_added()
+        board.listeners.append(self.on_board_event)
+
+    def set_board(self, window_size: tuple):
+        window_width, window_height = window_size
+        left = window_width // 20
+        cell_distance = (window_width // 2 - left) // (self.board.side_size * 10)
+        cell_size = (window_height - left) // self.board.side_size - cell_distance
+        top = (window_height - (cell_size + cell_distance) * self.board.side_size) // 2
+        return left, top, cell_distance, cell_size
 
-    @abstractmethod
-    def on_mouse_down(self, mouse_pos):
-        pass
-
-    @abstractmethod
-    def on_mouse_up(self):
-        pass
+    def cell_position(self, x: int, y: int):
+        return (self.left + (self.cell_size + self.cell_distance) * x,
+                self.top + (self.cell_size + self.cell_distance) * y)
+
+    def added_position(self, index: int):
+        return self.cell_position(self.board.side_size + 2 + index, 4)
+
+    def on_board_event(self, event: str, x: int, y: int):
+        if event == 'bomb' or event == 'rook':
+            sounds.play(event)
+        elif event == 'cell':
+            self.refresh_cell(x, y)
+        elif event == 'turn':
+            self.cancel_drag()
+            self.refresh_added()
+
+    def add_sprite(self, position, layer: int):
+        sprite = pygame.sprite.DirtySprite()
+        sprite.image = get_texture('emptyNOBODY.png', (self.cell_size, self.cell_size))
+        sprite.rect = sprite.image.get_rect(topleft=position)
+        self.cell_sprites.add(sprite, layer=layer)
+        return sprite
+
+    def set_image(self, sprite, image):
+        sprite.image = image
+        sprite.dirty = 1
+
+    def refresh_cell(self, x: int, y: int):
+        cell = self.board.table[y][x]
+        size = (self.cell_size, self.cell_size)
+        badge = self.badges.pop((x, y), None)
+        if badge is not None:
+            badge.kill()
+        if type(cell) == ChangedCell and cell.is_revealed:
+            self.set_image(self.sprites[y][x], get_texture(cell_image_name(type(cell.mask_cell), cell.direction), size))
+            mask_size = self.cell_size // 3
+            dist = self.cell_size // 1.7
+            cell_x, cell_y = self.cell_position(x, y)
+            badge = self.add_sprite((cell_x + dist, cell_y + dist), BADGE_LAYER)
+            self.set_image(badge, get_texture(f"changed{cell.direction.name}.png", (mask_size, mask_size)))
+            badge.rect.size = (mask_size, mask_size)
+            self.badges[(x, y)] = badge
+        else:
+            self.set_image(self.sprites[y][x], get_texture(cell_image_name(type(cell), cell.direction), size))
+
+    def refresh_added(self):
+        size = (self.cell_size, self.cell_size)
+        for sprite, cell_type in zip(self.added_sprites, self.board.added):
+            self.set_image(sprite, get_texture(cell_image_name(cell_type, self.board.current_direction), size))
+
+    def draw(self, screen, background):
+        # возвращает прямоугольники экрана, которые нужно обновить
+        return self.cell_sprites.draw(screen, background)
+
+    def repaint_rect(self, rect):
+        self.cell_sprites.repaint_rect(rect)
+
+    def cell_at(self, mouse_position):
+        # клетка под курсором за O(1): номер клетки по шагу сетки, затем проверка,
+        # что курсор не попал в промежуток между клетками
+        step = self.cell_size + self.cell_distance
+        x, offset_x = divmod(mouse_position[0] - self.left, step)
+        y, offset_y = divmod(mouse_position[1] - self.top, step)
+        if 0 <= x < self.board.side_size and 0 <= y < self.board.side_size:
+            if offset_x < self.cell_size and offset_y < self.cell_size:
+                return x, y
+        return None
 
+    def mouse_down_processing(self, mouse_position):
+        index = pygame.Rect(mouse_position, (1, 1)).collidelist(self.added_rects)
+        if index != -1:
+            x, y = self.added_rects[index].topleft
+            self.dragged = index
+            self.drag_x, self.drag_y = x, y
+            self.diff_x = mouse_position[0] - x
+            self.diff_y = mouse_position[1] - y
+            return None
+        self.pressed = self.cell_at(mouse_position)
 
-# класс, отвечающий за появление случайной клетки
-class RandomCell(ClickableCell):
-    def __init__(self, x: int, y: int, direction: Direction, board):
-        super().__init__(x, y, direction, board)
-        self.init_image('RandomCell')
+    def mouse_up_processing(self, mouse_position):
+        if self.dragged is not None:
+            self.drop_added()
+            return None
+        coordinates = self.cell_at(mouse_position)
+        if coordinates is not None and coordinates == self.pressed:
+            with profiler.section('turn'):
+                self.board.activate(*coordinates)
+        self.pressed = None
+
+    def drop_added(self):
+        # клетка ставится на поле, если её отпустили рядом с допустимой клеткой
+        index = self.dragged
+        self.cancel_drag()
+        step = self.cell_size + self.cell_distance
+        x = round((self.drag_x - self.left) / step)
+        y = round((self.drag_y - self.top) / step)
+        if 0 <= x < self.board.side_size and 0 <= y < self.board.side_size:
+            cell_x, cell_y = self.cell_position(x, y)
+            if abs(cell_x - self.drag_x) < self.cell_size // 3 and abs(cell_y - self.drag_y) < self.cell_size // 3:
+                with profiler.section('turn'):
+                    self.board.add_new_cell(index, x, y)
+
+    def cancel_drag(self):
+        if self.dragged is not None:
+            sprite = self.added_sprites[self.dragged]
+            sprite.rect.topleft = self.added_position(self.dragged)
+            sprite.dirty = 1
+            self.dragged = None
 
-    def on_mouse_up(self):
-        if not self.is_mouse_down:
+    def on_mouse_motion(self, mouse_position):
+        if self.dragged is not None:
+            self.drag_x = mouse_position[0] - self.diff_x
+            self.drag_y = mouse_position[1] - self.diff_y
+            sprite = self.added_sprites[self.dragged]
+            sprite.rect.topleft = (self.drag_x, self.drag_y)
+            sprite.dirty = 1
+
+
+# размеры клетки в пикселях для больших полей: текстуры масштабируются один раз на уровень
+ZOOM_LEVELS = [2, 3, 4, 6, 8, 12, 16, 24, 32, 48, 64]
+# клетки мельче этого размера рисуются цветом из миникарты, а не текстурами
+MIN_TILE_SIZE = 8
+# поля больше этого размера показываются через CameraView
+LARGE_BOARD_SIZE = 16
+# после стольких перерисовок за кадр перерисовывается весь видимый участок
+MAX_REPAINT_RECTS = 64
+
+# средний цвет каждой картинки для мелкого масштаба
+tile_colors = {}
+
+
+def get_tile_color(name):
+    if name not in tile_colors:
+        tile_colors[name] = pygame.transform.average_color(load_image(name, color_key=-1))
+    return tile_colors[name]
+
+
+# отображение большого поля: камера над полем с прокруткой и масштабом, рисуются
+# только клетки, попавшие в камеру. При мелком масштабе поле рисуется из миникарты,
+# где каждая клетка - один пиксель её цвета; координаты мыши переводятся в координаты поля
+class CameraView:
+    def __init__(self, board: DefaultBoard, window_size: tuple):
+        self.board = board
+        window_width, window_height = window_size
+        margin = window_height // 20
+        side = window_height - 2 * margin
+        self.viewport = pygame.Rect(margin, margin, min(side, window_width * 2 // 3), side)
+        self.added_size = margin * 2
+        self.added_rects = [pygame.Rect(self.added_position(index), (self.added_size, self.added_size))
+                            for index in range(len(self.board.added))]
+        side_range = range(self.board.side_size)
+        # картинки клеток, значки "изменяющихся клеток" и миникарта
+        self.names = [[None for _ in side_range] for _ in side_range]
+        self.badges = {}
+        self.minimap = pygame.Surface((self.board.side_size, self.board.side_size))
+        self.repaint = []
+        self.is_fully_dirty = False
+        # начальный масштаб - самый крупный, при котором поле целиком помещается в камеру
+        self.zoom = 0
+        for level, tile_size in enumerate(ZOOM_LEVELS):
+            if self.get_step(tile_size) * self.board.side_size <= self.viewport.width:
+                self.zoom = level
+        self.tile_size = ZOOM_LEVELS[self.zoom]
+        self.step = self.get_step(self.tile_size)
+        self.camera_x = self.camera_y = 0
+        self.move_camera(0, 0)
+        self.dragged = None
+        self.drag_x = 0
+        self.drag_y = 0
+        self.diff_x = 0
+        self.diff_y = 0
+        self.pressed = None
+        self.panning = None
+        for y in side_range:
+            for x in side_range:
+                self.refresh_cell(x, y)
+        board.listeners.append(self.on_board_event)
+
+    def get_step(self, tile_size: int):
+        # промежуток между клетками есть только у крупных клеток
+        return tile_size + (tile_size // 8 if tile_size >= MIN_TILE_SIZE else 0)
+
+    def added_position(self, index: int):
+        return (self.viewport.right + self.added_size,
+                self.viewport.top + self.added_size * (1 + index * 3 // 2))
+
+    def cell_rect(self, x: int, y: int):
+        return pygame.Rect(self.viewport.left - self.camera_x + x * self.step,
+                           self.viewport.top - self.camera_y + y * self.step, self.tile_size, self.tile_size)
+
+    def world_position(self, screen_position):
+        return (screen_position[0] - self.viewport.left + self.camera_x,
+                screen_position[1] - self.viewport.top + self.camera_y)
+
+    def clamp_camera(self, camera: int, view_size: int):
+        # поле меньше камеры стоит по центру, большее не уезжает за края
+        world_size = self.board.side_size * self.step
+        if world_size <= view_size:
+            return -(view_size - world_size) // 2
+        return max(0, min(world_size - view_size, camera))
+
+    def move_camera(self, dx: int, dy: int):
+        self.camera_x = self.clamp_camera(self.camera_x + dx, self.viewport.width)
+        self.camera_y = self.clamp_camera(self.camera_y + dy, self.viewport.height)
+        self.repaint_rect(self.viewport)
+
+    def scroll(self, dx: int, dy: int):
+        # прокрутка клавишами на четверть камеры
+        self.move_camera(dx * self.viewport.width // 4, dy * self.viewport.height // 4)
+
+    def set_zoom(self, mouse_position, steps: int):
+        # масштаб меняется вокруг курсора: точка поля под ним остаётся на месте
+        level = max(0, min(len(ZOOM_LEVELS) - 1, self.zoom + steps))
+        if level == self.zoom:
+            return None
+        if not self.viewport.collidepoint(mouse_position):
+            mouse_position = self.viewport.center
+        world_x, world_y = self.world_position(mouse_position)
+        old_step = self.step
+        self.zoom = level
+        self.tile_size = ZOOM_LEVELS[level]
+        self.step = self.get_step(self.tile_size)
+        self.camera_x = world_x * self.step // old_step - (mouse_position[0] - self.viewport.left)
+        self.camera_y = world_y * self.step // old_step - (mouse_position[1] - self.viewport.top)
+        self.cancel_drag()
+        self.move_camera(0, 0)
+
+    def on_board_event(self, event: str, x: int, y: int):
+        if event == 'bomb' or event == 'rook':
+            sounds.play(event)
+        elif event == 'cell':
+            self.refresh_cell(x, y)
+        elif event == 'turn':
+            self.cancel_drag()
+            for rect in self.added_rects:
+                self.repaint_rect(rect)
+
+    def refresh_cell(self, x: int, y: int):
+        cell = self.board.table[y][x]
+        self.badges.pop((x, y), None)
+        if type(cell) == ChangedCell and cell.is_revealed:
+            name = cell_image_name(type(cell.mask_cell), cell.direction)
+            self.badges[(x, y)] = f"changed{cell.direction.name}.png"
+        else:
+            name = cell_image_name(type(cell), cell.direction)
+        self.names[y][x] = name
+        self.minimap.set_at((x, y), get_tile_color(name))
+        rect = self.cell_rect(x, y)
+        if rect.colliderect(self.viewport):
+            self.repaint_rect(rect)
+
+    def repaint_rect(self, rect):
+        if self.is_fully_dirty:
             return None
-        if self.board.current_direction != self.direction:
+        if len(self.repaint) >= MAX_REPAINT_RECTS:
+            self.repaint = [self.viewport.copy(), *self.added_rects]
+            if self.dragged is not None:
+                self.repaint.append(self.dragged_rect())
+            self.is_fully_dirty = True
             return None
-        current_variant = random.choice(all_cells[2:])
-        self.board.table[self.table_y][self.table_x] = current_variant(self.table_x, self.table_y, self.direction,
-                                                                       self.board)
-        self.board.change_current_direction()
-
-    def on_mouse_down(self, mouse_pos):
-        self.is_mouse_down = True
+        self.repaint.append(pygame.Rect(rect))
+
+    def draw(self, screen, background):
+        # возвращает прямоугольники экрана, которые нужно обновить
+        rects, self.repaint = self.repaint, []
+        self.is_fully_dirty = False
+        for rect in rects:
+            screen.blit(background, rect, rect)
+            self.draw_cells(screen, rect)
+        if rects:
+            self.draw_added(screen)
+        return rects
+
+    def draw_cells(self, screen, area):
+        area = area.clip(self.viewport)
+        if not area:
+            return None
+        step = self.step
+        first_x = max(0, (area.left - self.viewport.left + self.camera_x) // step)
+        first_y = max(0, (area.top - self.viewport.top + self.camera_y) // step)
+        last_x = min(self.board.side_size, (area.right - self.viewport.left + self.camera_x - 1) // step + 1)
+        last_y = min(self.board.side_size, (area.bottom - self.viewport.top + self.camera_y - 1) // step + 1)
+        if first_x >= last_x or first_y >= last_y:
+            return None
+        origin_x = self.viewport.left - self.camera_x
+        origin_y = self.viewport.top - self.camera_y
+        screen.set_clip(area)
+        if self.tile_size < MIN_TILE_SIZE:
+            # видимая часть миникарты растягивается одним вызовом
+            part = self.minimap.subsurface((first_x, first_y, last_x - first_x, last_y - first_y))
+            size = ((last_x - first_x) * step, (last_y - first_y) * step)
+            screen.blit(pygame.transform.scale(part, size), (origin_x + first_x * step, origin_y + first_y * step))
+        else:
+            size = (self.tile_size, self.tile_size)
+            tiles = {}
+            blits = []
+            for y in range(first_y, last_y):
+                row = self.names[y]
+                for x in range(first_x, last_x):
+                    name = row[x]
+                    if name not in tiles:
+                        tiles[name] = get_texture(name, size)
+                    blits.append((tiles[name], (origin_x + x * step, origin_y + y * step)))
+            mask_size = self.tile_size // 3
+            dist = int(self.tile_size // 1.7)
+            for (x, y), name in self.badges.items():
+                if first_x <= x < last_x and first_y <= y < last_y:
+                    blits.append((get_texture(name, (mask_size, mask_size)),
+                                  (origin_x + x * step + dist, origin_y + y * step + dist)))
+            screen.blits(blits, doreturn=False)
+        screen.set_clip(None)
+
+    def draw_added(self, screen):
+        size = (self.added_size, self.added_size)
+        for index, cell_type in enumerate(self.board.added):
+            image = get_texture(cell_image_name(cell_type, self.board.current_direction), size)
+            if index == self.dragged:
+                screen.blit(get_texture(cell_image_name(cell_type, self.board.current_direction),
+                                        (self.tile_size, self.tile_size)), (self.drag_x, self.drag_y))
+            else:
+                screen.blit(image, self.added_rects[index])
 
+    def cell_at(self, mouse_position):
+        if not self.viewport.collidepoint(mouse_position):
+            return None
+        world_x, world_y = self.world_position(mouse_position)
+        x, offset_x = divmod(world_x, self.step)
+        y, offset_y = divmod(world_y, self.step)
+        if 0 <= x < self.board.side_size and 0 <= y < self.board.side_size:
+            if offset_x < self.tile_size and offset_y < self.tile_size:
+                return x, y
+        return None
 
-# класс клетки бомбы
-class BombCell(ClickableCell):
-    def __init__(self, x: int, y: int, direction: Direction, board):
-        super().__init__(x, y, direction, board)
-        self.init_image('BombCell')
+    def dragged_rect(self):
+        return pygame.Rect(self.drag_x, self.drag_y, self.tile_size, self.tile_size)
 
-    def on_mouse_up(self):
-        if not self.is_mouse_down:
+    def mouse_down_processing(self, mouse_position):
+        index = pygame.Rect(mouse_position, (1, 1)).collidelist(self.added_rects)
+        if index != -1:
+            # перетаскиваемая клетка сразу принимает размер клеток поля
+            self.dragged = index
+            self.diff_x = self.diff_y = self.tile_size // 2
+            self.drag_x = mouse_position[0] - self.diff_x
+            self.drag_y = mouse_position[1] - self.diff_y
+            self.repaint_rect(self.added_rects[index])
+            self.repaint_rect(self.dragged_rect())
             return None
-        if self.board.current_direction != self.direction:
+        self.pressed = self.cell_at(mouse_position)
+
+    def mouse_up_processing(self, mouse_position):
+        if self.dragged is not None:
+            self.drop_added()
             return None
-        neighbors = [(self.table_x, self.table_y + 1), (self.table_x, self.table_y - 1),
-                     (self.table_x + 1, self.table_y), (self.table_x - 1, self.table_y)]
-        for neighbor in neighbors:
-            neighbor_x, neighbor_y = neighbor
-            if neighbor_x in range(self.board.side_size) and neighbor_y in range(self.board.side_size):
-                if type(self.board.table[neighbor_y][neighbor_x]) == CapitalCell:
-                    continue
-                zv = random.randint(1, 2)
-                if zv == 1:
-                    bomb_sound.play()
-                elif zv == 2:
-                    bomb_sound2.play()
-                self.board.table[neighbor_y][neighbor_x] = EmptyCell(neighbor_x, neighbor_y, self.direction, self.board)
-        self.board.table[self.table_y][self.table_x] = EmptyCell(self.table_x, self.table_y, self.direction, self.board)
-        self.board.change_current_direction()
+        coordinates = self.cell_at(mouse_position)
+        if coordinates is not None and coordinates == self.pressed:
+            with profiler.section('turn'):
+                self.board.activate(*coordinates)
+        self.pressed = None
+
+    def drop_added(self):
+        # клетка ставится в клетку поля под центром перетаскиваемой
+        index = self.dragged
+        center = self.dragged_rect().center
+        self.cancel_drag()
+        coordinates = self.cell_at(center)
+        if coordinates is not None:
+            with profiler.section('turn'):
+                self.board.add_new_cell(index, *coordinates)
+
+    def cancel_drag(self):
+        if self.dragged is not None:
+            self.repaint_rect(self.dragged_rect())
+            self.repaint_rect(self.added_rects[self.dragged])
+            self.dragged = None
+
+    def start_pan(self, mouse_position):
+        self.panning = mouse_position
+
+    def end_pan(self):
+        self.panning = None
 
-    def on_mouse_down(self, mouse_pos):
-        self.is_mouse_down = True
+    def on_mouse_motion(self, mouse_position):
+        if self.panning is not None:
+            self.move_camera(self.panning[0] - mouse_position[0], self.panning[1] - mouse_position[1])
+            self.panning = mouse_position
+        if self.dragged is not None:
+            self.repaint_rect(self.dragged_rect())
+            self.drag_x = mouse_position[0] - self.diff_x
+            self.drag_y = mouse_position[1] - self.diff_y
+            self.repaint_rect(self.dragged_rect())
 
 
-class ProtectedCell(DefaultCell):
-    pass
+def create_view(board: DefaultBoard, window_size: tuple):
+    if board.side_size > LARGE_BOARD_SIZE:
+        return CameraView(board, window_size)
+    return BoardView(board, window_size)
 
 
-# класс клетки башни
-class TowerCell(ProtectedCell):
-    def __init__(self, x: int, y: int, direction: Direction, board):
-        super().__init__(x, y, direction, board)
-        self.init_image('TowerCell')
+# сколько главный цикл спит без событий и таймеров, и как часто обновляется
+# надпись о загрузке в меню (в секундах)
+IDLE_TIMEOUT = 1.0
+LOADING_REFRESH = 0.1
 
 
-# класс клетки "Яндекс"
-class YandexCell(ClickableCell, ProtectedCell):
-    def __init__(self, x: int, y: int, direction: Direction, board):
-        super().__init__(x, y, direction, board)
-        self.init_image('YandexCell')
+# таймеры игры по монотонным часам: главный цикл спит до ближайшего таймера или события.
+# callback получает срок таймера, чтобы повторяющийся таймер не накапливал опоздания
+class Scheduler:
+    def __init__(self):
+        self.timers = []
+        self.counter = itertools.count()
 
-    def on_mouse_up(self):
-        if not self.is_mouse_down:
-            return None
-        if self.board.current_direction != self.direction:
-            return None
-        yandexed = []
-        for row in self.board.table:
-            for cell in row:
-                if cell.direction == Direction.NOBODY or cell.direction == Direction.NONE:
-                    neighbors = [(cell.table_x, cell.table_y + 1), (cell.table_x, cell.table_y - 1),
-                                 (cell.table_x + 1, cell.table_y), (cell.table_x - 1, cell.table_y)]
-                    rook_sound.play()
-                    for neighbor in neighbors:
-                        neighbor_x, neighbor_y = neighbor
-                        if neighbor_x in range(self.board.side_size) and neighbor_y in range(self.board.side_size):
-                            if self.board.table[neighbor_y][neighbor_x].direction == self.direction:
-                                if type(cell) == CapitalCell:
-                                    continue
-                                yandexed.append((cell.table_x, cell.table_y))
-        for coordinates in yandexed:
-            x, y = coordinates
-            self.board.table[y][x] = EmptyCell(x, y, self.direction, self.board)
-        self.board.table[self.table_y][self.table_x] = EmptyCell(self.table_x, self.table_y, self.direction, self.board)
-        self.board.change_current_direction()
-
-    def on_mouse_down(self, mouse_pos):
-        self.is_mouse_down = True
-
-
-# класс, описывающий "изменяющюся клетку" в игре
-class TurnCell(DefaultCell):
-    def __init__(self, x: int, y: int, direction: Direction, board):
-        super().__init__(x, y, direction, board)
-
-    @abstractmethod
-    def on_turn_changed(self):
-        pass
-
-
-class ChangedCell(TurnCell):
-    def __init__(self, x: int, y: int, direction: Direction, board):
-        super().__init__(x, y, direction, board)
-        self.mask_cell = random.choice(all_cells[1:])(self.table_x, self.table_y, self.direction, self.board)
-        self.init_image('ChangedCell')
-
-    def on_turn_changed(self):
-        if self.board.current_direction != self.direction:
-            return None
-        self.mask_cell = random.choice(all_cells[2:])(self.table_x, self.table_y, self.direction, self.board)
-        self.mask_cell.init_image(type(self.mask_cell).__name__)
-        self.mask_image()
-
-    def mask_image(self):
-        if self.sprite:
-            cell_sprites.remove(self.sprite)
-        self.sprite = pygame.sprite.Sprite()
-        self.sprite.image = load_image(f"changed{self.direction.name}.png", color_key=-1)
-        mask_size = self.board.cell_size // 3
-        dist = self.board.cell_size // 1.7
-        self.sprite.image = pygame.transform.scale(self.sprite.image, (mask_size, mask_size))
-        self.sprite.rect = (self.x + dist, self.y + dist)
-        cell_sprites.add(self.sprite)
-
-
-all_cells = [ChangedCell, RandomCell, EmptyCell, TowerCell, BombCell, YandexCell]
-all_cells_chances = [0.5, 0.3, 0, 0.3, 0.3, 0.6]
-directions = [Direction.BLUE, Direction.ORANGE]
-current_direction = Direction.ORANGE
-
-
-# класс, отвечающий за добавление клетки на поле
-class AddingCell(ClickableCell):
-    def __init__(self, x: int, y: int, direction: Direction, board):
-        self.is_draggable = False
-        self.is_correct_coordinates = False
-        self.draw_x = board.left + (board.cell_size + board.cell_distance) * x
-        self.draw_y = board.top + (board.cell_size + board.cell_distance) * y
-        self.diff_x = 0
-        self.diff_y = 0
-        super().__init__(x, y, direction, board)
-        self.new_cell = random.choice(all_cells)
-        self.init_image(self.new_cell.__name__)
-
-    def init_image(self, name):
-        if self.sprite:
-            cell_sprites.remove(self.sprite)
-        self.sprite = pygame.sprite.Sprite()
-        self.sprite.image = load_image(f"{name[:-4].lower()}{self.direction.name}.png", color_key=-1)
-        self.sprite.image = pygame.transform.scale(self.sprite.image, (self.board.cell_size, self.board.cell_size))
-        self.sprite.rect = (self.draw_x, self.draw_y)
-        cell_sprites.add(self.sprite)
-
-    def on_mouse_down(self, mouse_pos: tuple):
-        self.diff_x = mouse_pos[0] - self.x
-        self.diff_y = mouse_pos[1] - self.y
-        self.is_draggable = True
-
-    def on_mouse_up(self):
-        self.draw_x = self.x
-        self.draw_y = self.y
-        self.is_draggable = False
-        self.init_image(self.new_cell.__name__)
-
-    def on_drag(self, mouse_position: tuple):
-        if self.is_draggable:
-            self.draw_x, self.draw_y = mouse_position[0] - self.diff_x, mouse_position[1] - self.diff_y
-            self.init_image(self.new_cell.__name__)
-
-
-# класс поля в стандартном режиме
-class DefaultBoard:
-    def __init__(self, side_size: int):
-        self.side_size = side_size
-        self.left, self.top, self.cell_distance, self.cell_size = self.set_board()
-        side_range = range(self.side_size)
-        self.table = [[EmptyCell(x, y, Direction.NOBODY, self) for x in side_range] for y in side_range]
-        self.create_capitals(distance=3)
-        self.added = [AddingCell(x + side_size + 2, 4, current_direction, self) for x in range(3)]
-        self.current_direction = Direction.ORANGE
-        self.winner = None
-
-    def is_win(self):
-        is_blue_capital_alive = False
-        is_orange_capital_alive = False
-        for row in self.table:
-            for cell in row:
-                if type(cell) == CapitalCell:
-                    if cell.direction == Direction.BLUE:
-                        is_blue_capital_alive = True
-                    else:
-                        is_orange_capital_alive = True
-        if is_orange_capital_alive and is_blue_capital_alive:
-            return None
-        else:
-            if is_orange_capital_alive:
-                self.winner = Direction.ORANGE
-            else:
-                self.winner = Direction.BLUE
-            return True
+    def call_at(self, deadline: float, callback):
+        timer = [deadline, next(self.counter), callback]
+        heapq.heappush(self.timers, timer)
+        return timer
 
-    def set_board(self):
-        window_width = pygame.display.get_window_size()[0]
-        window_height = pygame.display.get_window_size()[1]
-        left = window_width // 20
-        cell_distance = (window_width // 2 - left) // (self.side_size * 10)
-        cell_size = (window_height - left) // self.side_size - cell_distance
-        top = (window_height - (cell_size + cell_distance) * self.side_size) // 2
-        return left, top, cell_distance, cell_size
+    def call_later(self, delay: float, callback):
+        return self.call_at(time.monotonic() + delay, callback)
 
-    def change_current_direction(self):
-        # функция изменения хода
-        for row in self.table:
-            for cell in row:
-                if issubclass(type(cell), TurnCell):
-                    cell.on_turn_changed()
-        self.current_direction = directions[(directions.index(self.current_direction) + 1) % 2]
-        self.added = [AddingCell(x, 4, self.current_direction, self)
-                      for x in range(self.side_size + 2, self.side_size + 5)]
-
-    def create_capitals(self, distance: int):
-        first_x, second_x = random.choices(range(self.side_size), k=2)
-        first_y, second_y = random.choices(range(self.side_size), k=2)
-        if abs(first_x - second_x) > distance and abs(first_y - second_y) > distance:
-            self.table[first_y][first_x] = CapitalCell(first_x, first_y, Direction.BLUE, self)
-            self.table[second_y][second_x] = CapitalCell(second_x, second_y, Direction.ORANGE, self)
-            return None
-        self.create_capitals(distance)
-
-    def is_cell_can_be_captured(self, x: int, y: int):
-        if self.table[y][x].direction == self.current_direction and type(self.table[y][x]) != EmptyCell:
-            return False
-        if self.table[y][x].direction == directions[(directions.index(self.current_direction) + 1) % 2]:
-            if issubclass(type(self.table[y][x]), ProtectedCell):
-                return False
-        neighbors = [(x, y + 1), (x, y - 1), (x + 1, y), (x - 1, y)]
-        for neighbor in neighbors:
-            neighbor_x, neighbor_y = neighbor
-            if neighbor_x in range(self.side_size) and neighbor_y in range(self.side_size):
-                neighbor_cell = self.table[neighbor_y][neighbor_x]
-                if neighbor_cell.direction == self.current_direction:
-                    return True
-        return False
-
-    def add_new_cell(self, cell: AddingCell):
-        for x in range(self.side_size):
-            for y in range(self.side_size):
-                table_cell = self.table[y][x]
-                if self.is_cell_can_be_captured(x, y):
-                    x_diff = abs(table_cell.x - cell.draw_x)
-                    y_diff = abs(table_cell.y - cell.draw_y)
-                    if x_diff < self.cell_size // 3 and y_diff < self.cell_size // 3:
-                        self.table[y][x] = cell.new_cell(x, y, self.current_direction, self)
-                        self.change_current_direction()
+    def cancel(self, timer):
+        timer[2] = None
 
-    def mouse_down_processing(self, mouse_position):
-        for cell in self.added:
-            x_range = range(cell.x, cell.x + self.cell_size)
-            y_range = range(cell.y, cell.y + self.cell_size)
-            if mouse_position[0] in x_range and mouse_position[1] in y_range:
-                cell.on_mouse_down(mouse_position)
-        for row in self.table:
-            for cell in row:
-                if issubclass(type(cell), ClickableCell):
-                    x_range = range(cell.x, cell.x + self.cell_size)
-                    y_range = range(cell.y, cell.y + self.cell_size)
-                    if mouse_position[0] in x_range and mouse_position[1] in y_range:
-                        cell.on_mouse_down(mouse_position)
-                if type(cell) == ChangedCell:
-                    if issubclass(type(cell.mask_cell), ClickableCell):
-                        x_range = range(cell.x, cell.x + self.cell_size)
-                        y_range = range(cell.y, cell.y + self.cell_size)
-                        if mouse_position[0] in x_range and mouse_position[1] in y_range:
-                            cell.mask_cell.on_mouse_down(mouse_position)
+    def clear(self):
+        self.timers = []
 
-    def mouse_up_processing(self, mouse_position):
-        for cell in self.added:
-            if cell.is_draggable:
-                self.add_new_cell(cell)
-            cell.on_mouse_up()
-        for row in self.table:
-            for cell in row:
-                if issubclass(type(cell), ClickableCell):
-                    x_range = range(cell.x, cell.x + self.cell_size)
-                    y_range = range(cell.y, cell.y + self.cell_size)
-                    if mouse_position[0] in x_range and mouse_position[1] in y_range:
-                        cell.on_mouse_up()
-                if type(cell) == ChangedCell:
-                    if issubclass(type(cell.mask_cell), ClickableCell):
-                        x_range = range(cell.x, cell.x + self.cell_size)
-                        y_range = range(cell.y, cell.y + self.cell_size)
-                        if mouse_position[0] in x_range and mouse_position[1] in y_range:
-                            cell.mask_cell.on_mouse_up()
-        self.added[0].on_mouse_up()
+    def run_due(self):
+        now = time.monotonic()
+        while self.timers and self.timers[0][0] <= now:
+            deadline, _, callback = heapq.heappop(self.timers)
+            if callback is not None:
+                callback(deadline)
 
-    def on_mouse_motion(self, mouse_position):
-        for cell in self.added:
-            cell.on_drag(mouse_position)
-
-
-# класс поля в режиме блитц
-class BlitzBoard(DefaultBoard):
-    def __init__(self, side_size: int):
-        super().__init__(side_size)
-        self.timer = 5
-
-    def change_current_direction(self):
-        for row in self.table:
-            for cell in row:
-                if issubclass(type(cell), TurnCell):
-                    cell.on_turn_changed()
-        self.current_direction = directions[(directions.index(self.current_direction) + 1) % 2]
-        self.added = [AddingCell(x, 4, self.current_direction, self)
-                      for x in range(self.side_size + 2, self.side_size + 5)]
-        self.timer = 5
-
-
-# класс поля в режиме "Death"
-class DeadBoard(DefaultBoard):
-    def change_current_direction(self):
-        self.delete_cell()
-        for row in self.table:
-            for cell in row:
-                if issubclass(type(cell), TurnCell):
-                    cell.on_turn_changed()
-        self.current_direction = directions[(directions.index(self.current_direction) + 1) % 2]
-        self.added = [AddingCell(x, 4, self.current_direction, self)
-                      for x in range(self.side_size + 2, self.side_size + 5)]
-
-    def is_cell_can_be_captured(self, x: int, y: int):
-        if type(self.table[y][x]) == DeadCell:
-            return False
-        if self.table[y][x].direction == directions[(directions.index(self.current_direction) + 1) % 2]:
-            if issubclass(type(self.table[y][x]), ProtectedCell):
-                return False
-        neighbors = [(x, y + 1), (x, y - 1), (x + 1, y), (x - 1, y)]
-        for neighbor in neighbors:
-            neighbor_x, neighbor_y = neighbor
-            if neighbor_x in range(self.side_size) and neighbor_y in range(self.side_size):
-                neighbor_cell = self.table[neighbor_y][neighbor_x]
-                if neighbor_cell.direction == self.current_direction:
-                    return True
-        return False
-
-    def add_new_cell(self, cell: AddingCell):
-        for x in range(self.side_size):
-            for y in range(self.side_size):
-                table_cell = self.table[y][x]
-                if self.is_cell_can_be_captured(x, y):
-                    x_diff = abs(table_cell.x - cell.draw_x)
-                    y_diff = abs(table_cell.y - cell.draw_y)
-                    if x_diff < self.cell_size // 3 and y_diff < self.cell_size // 3:
-                        self.table[y][x] = cell.new_cell(x, y, self.current_direction, self)
-                        self.change_current_direction()
-
-    def delete_cell(self):
-        x, y = random.choices(range(self.side_size), k=2)
-        if self.table[y][x].direction == Direction.NOBODY:
-            self.table[y][x] = DeadCell(x, y, Direction.NONE, self)
-            return None
-        empties = 0
-        for row in self.table:
-            for cell in row:
-                if cell.direction == Direction.NOBODY:
-                    empties += 1
-        if empties > 0:
-            self.delete_cell()
+    def timeout(self, limit: float):
+        # сколько можно спать до ближайшего таймера, но не больше limit
+        if not self.timers:
+            return limit
+        return max(0.0, min(limit, self.timers[0][0] - time.monotonic()))
 
 
-all_game_modes = [DefaultBoard, DeadBoard, BlitzBoard]
+def wait_events(timeout: float):
+    # ждёт первое событие не дольше timeout секунд и забирает остальные из очереди
+    event = pygame.event.wait(max(1, int(timeout * 1000)))
+    if event.type == pygame.NOEVENT:
+        return []
+    return [event] + pygame.event.get()
 
 
 # класс игрового менеджера и показа игры на ваш экран
@@ -488,35 +663,153 @@ class GameManager:
         self.start_sprites = pygame.sprite.Group()
         self.is_game_process = False
         self.board = None
-        pygame.mixer.music.play(loops=-1)
+        self.view = None
+        self.background = pygame.Surface(self.screen.get_size())
+        self.background.fill(pygame.Color(27, 27, 27))
+        self.hud_text = None
+        self.hud_rect = None
+        self.overlay_rect = None
+        # компьютерный противник играет за синих, включается клавишей [A] в меню
+        self.computer = None
+        self.menu_sprites = {}
+        self.is_music_playing = False
+        # запись партий в файл, включается параметром --record
+        self.recorder = None
+        # снимок незаконченной партии, параметр --save: пишется после каждого хода и при выходе,
+        # при следующем запуске партия продолжается с него
+        self.save_path = None
+        # размер поля, задаётся параметром --size
+        self.side_size = 8
+        # ограничение кадров в секунду, задаётся параметром --fps
+        self.frame_cap = 60
+        self.clock = pygame.time.Clock()
+        self.scheduler = Scheduler()
+        self.blitz_timer = None
+        # что-то изменилось и кадр нужно перерисовать
+        self.is_dirty = True
+        assets.start(is_audio=not sounds.is_muted and pygame.mixer.get_init() is not None)
+
+    def start_music(self):
+        # музыка включается, как только загрузится
+        if not self.is_music_playing and assets.is_music_ready and not sounds.is_muted:
+            pygame.mixer.music.play(loops=-1)
+            self.is_music_playing = True
 
     def start(self):
+        # меню перерисовывается только при изменениях, между ними цикл ждёт событий
         x = self.screen.get_size()[0] // 3
         y = self.screen.get_size()[1] * 2 // 3
-        shrift = pygame.font.SysFont('Times New Romans', 60)
         game_mode_id = 0
+        shown_loaded = None
+        is_menu_changed = True
+        board = self.load_saved_game()
+        if board is not None:
+            self.is_game_process = True
+            self.set_game(board)
+            self.play()
+            return None
         while not self.is_game_process:
-            for event in pygame.event.get():
+            is_loading = not assets.is_done()
+            for event in wait_events(LOADING_REFRESH if is_loading else IDLE_TIMEOUT):
                 if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
                     if event.pos[1] in range(y // 2, y // 2 + y // 3):
                         if event.pos[0] in range(int(x * 2.1), int(x * 2.1) + x // 2):
                             game_mode_id = (game_mode_id + 1) % len(all_game_modes)
+                            is_menu_changed = True
                         elif event.pos[0] in range(int(x * 0.4), int(x * 0.4) + x // 2):
                             game_mode_id = (game_mode_id - 1) % len(all_game_modes)
+                            is_menu_changed = True
                 if event.type == pygame.KEYDOWN:
+                    if event.key == pygame.K_a:
+                        self.computer = None if self.computer else ComputerPlayer(Direction.BLUE)
+                        is_menu_changed = True
                     if event.key == pygame.K_SPACE:
                         self.is_game_process = True
-                        self.board = all_game_modes[game_mode_id](8)
+                        self.set_game(all_game_modes[game_mode_id](self.side_size, random.getrandbits(63)))
+                        if self.recorder:
+                            self.recorder.start_game(self.board)
                         self.play()
                         return None
+                if event.type == pygame.VIDEOEXPOSE:
+                    is_menu_changed = True
+            self.start_music()
+            if not is_menu_changed and shown_loaded == assets.loaded:
+                continue
+            is_menu_changed = False
+            shown_loaded = assets.loaded
             self.refresh_menu(game_mode_id)
             self.screen.fill(pygame.Color(27, 27, 27))
             self.start_sprites.draw(self.screen)
-            self.screen.blit(shrift.render('[SPACE] - to start', True, (255, 255, 255)), (x * 1.2, y * 1.5 - 100))
+            self.screen.blit(render_text(TEXT_FONT, 60, '[SPACE] - to start'), (x * 1.2, y * 1.5 - 100))
+            computer_text = '[A] - computer: ' + ('on' if self.computer else 'off')
+            self.screen.blit(render_text(TEXT_FONT, 60, computer_text), (x * 1.2, y * 1.5 - 30))
+            if is_loading:
+                loading_text = f'Loading {assets.loaded}/{assets.total}'
+                self.screen.blit(render_text(TEXT_FONT, 60, loading_text), (x * 1.2, y * 1.5 + 40))
             pygame.display.flip()
 
+    def set_game(self, board):
+        # новое поле: вид, подписка на события и таймер блитца от начала хода
+        self.board = board
+        self.view = create_view(board, self.screen.get_size())
+        board.listeners.append(self.on_board_event)
+        self.scheduler.clear()
+        self.blitz_timer = None
+        if type(board) == BlitzBoard:
+            self.schedule_blitz_tick(time.monotonic())
+
+    def on_board_event(self, event: str, x: int, y: int):
+        self.is_dirty = True
+        if event == 'turn':
+            self.save_game()
+            if type(self.board) == BlitzBoard:
+                self.schedule_blitz_tick(time.monotonic())
+
+    def load_saved_game(self):
+        # партия из --save; пустой или повреждённый файл откладывается в .bad, и игра
+        # начинается с меню, а не падает при каждом запуске
+        if not self.save_path or not os.path.exists(self.save_path):
+            return None
+        try:
+            with SnapshotFile(self.save_path) as snapshots:
+                if not snapshots:
+                    raise ValueError('the file has no snapshots')
+                return snapshots[-1].restore()
+        except (ValueError, IndexError, struct.error) as error:
+            print(f'cannot resume {self.save_path}: {error}')
+            os.replace(self.save_path, self.save_path + '.bad')
+            return None
+
+    def save_game(self):
+        # снимок пишется во временный файл и подменяет старый, чтобы падение не оставило половину
+        if self.save_path is None:
+            return None
+        save_snapshot(self.save_path + '.tmp', self.board)
+        os.replace(self.save_path + '.tmp', self.save_path)
+
+    def schedule_blitz_tick(self, start: float):
+        # секунды хода в блитце отсчитываются от его начала
+        if self.blitz_timer is not None:
+            self.scheduler.cancel(self.blitz_timer)
+        self.blitz_timer = self.scheduler.call_at(start + 1, self.blitz_tick)
+
+    def blitz_tick(self, deadline: float):
+        turn_number = self.board.turn_number
+        self.board.tick()
+        if self.board.turn_number == turn_number:
+            self.blitz_timer = self.scheduler.call_at(deadline + 1, self.blitz_tick)
+        if self.board.timer <= 0:
+            self.view.cancel_drag()
+        self.is_dirty = True
+
     def refresh_menu(self, mode_id):
-        self.start_sprites = pygame.sprite.Group()
+        # спрайты меню собираются один раз для каждого режима
+        if mode_id not in self.menu_sprites:
+            self.menu_sprites[mode_id] = self.create_menu_sprites(mode_id)
+        self.start_sprites = self.menu_sprites[mode_id]
+
+    def create_menu_sprites(self, mode_id):
+        start_sprites = pygame.sprite.Group()
         x = self.screen.get_size()[0] // 3
         y = self.screen.get_size()[1] * 2 // 3
         if all_game_modes[mode_id] == DefaultBoard:
@@ -528,73 +821,204 @@ class GameManager:
         else:
             name = ''
         tower = pygame.sprite.Sprite()
-        tower.image = load_image(name, color_key=-1)
-        tower.image = pygame.transform.scale(tower.image, (x, y))
+        tower.image = get_texture(name, (x, y))
         tower.rect = (x, y // 8)
-        self.start_sprites.add(tower)
+        start_sprites.add(tower)
 
         right = pygame.sprite.Sprite()
-        right.image = load_image('rightButton.png', color_key=-1)
-        right.image = pygame.transform.scale(right.image, (x // 2, y // 3))
+        right.image = get_texture('rightButton.png', (x // 2, y // 3))
         right.rect = (int(x * 2.1), y // 2)
-        self.start_sprites.add(right)
+        start_sprites.add(right)
 
         left = pygame.sprite.Sprite()
-        left.image = load_image('leftButton.png', color_key=-1)
-        left.image = pygame.transform.scale(left.image, (x // 2, y // 3))
+        left.image = get_texture('leftButton.png', (x // 2, y // 3))
         left.rect = (int(x * 0.4), y // 2)
-        self.start_sprites.add(left)
+        start_sprites.add(left)
+        return start_sprites
 
     def play(self):
-        clock = pygame.time.Clock()
-        shrift = pygame.font.SysFont('Times New Romans', 200)
-        shrift2 = pygame.font.SysFont('Times New Romans', 100)
-        pygame.time.set_timer(pygame.USEREVENT, 1000)
+        # цикл спит до события или таймера; пока думает компьютер или открыт оверлей,
+        # состояние проверяется каждый кадр. Кадр рисуется, только если что-то изменилось
+        self.redraw_all()
         while self.is_game_process:
-            if not self.board.is_win():
-                self.manage_events()
-                self.render()
-            else:
+            self.start_music()
+            is_busy = self.is_computer_turn() or profiler.is_overlay_shown
+            events = wait_events(self.scheduler.timeout(1 / self.frame_cap if is_busy else IDLE_TIMEOUT))
+            profiler.begin_frame()
+            with profiler.section('manage_events'):
+                self.manage_events(events)
+            self.scheduler.run_due()
+            if self.computer:
+                with profiler.section('turn'):
+                    self.computer.poll(self.board)
+            with profiler.section('is_win'):
+                is_win = self.board.is_win()
+            if is_win:
                 self.finish()
-            if type(self.board) == BlitzBoard:
-                if self.board.timer > 0:
-                    text = str(self.board.timer).rjust(15)
-                    self.screen.blit(shrift.render(text, True, (255, 255, 255)), (900, 200))
-                elif self.board.timer == -2:
-                    self.board.change_current_direction()
-                else:
-                    self.board.mouse_up_processing((0, 0))
-                    text = 'Переход хода!'
-                    self.screen.blit(shrift2.render(text, True, (255, 255, 255)), (1300, 200))
-            pygame.display.flip()
-            clock.tick(60)
+            elif self.is_dirty or profiler.is_overlay_shown:
+                with profiler.section('render'):
+                    self.render()
+                self.is_dirty = False
+                sounds.update()
+                self.clock.tick(self.frame_cap)
+            profiler.end_frame()
+        if self.recorder and self.recorder.board:
+            self.recorder.end_game()
+        if self.save_path and self.board.is_win():
+            os.remove(self.save_path)
+        else:
+            self.save_game()
         pygame.quit()
 
+    def watch(self, game):
+        # просмотр записанной партии: стрелки - ход вперёд и назад, Home и End - начало и конец
+        position = 0
+        self.show_replay_position(game, position)
+        while True:
+            for event in wait_events(IDLE_TIMEOUT):
+                if event.type != pygame.KEYDOWN:
+                    continue
+                if event.key == pygame.K_ESCAPE:
+                    pygame.quit()
+                    return None
+                seek = {pygame.K_RIGHT: position + 1, pygame.K_LEFT: position - 1,
+                        pygame.K_HOME: 0, pygame.K_END: len(game.moves)}
+                new_position = max(0, min(len(game.moves), seek.get(event.key, position)))
+                if new_position == position + 1:
+                    self.board.apply_move(game.moves[position])
+                elif new_position != position:
+                    self.show_replay_position(game, new_position)
+                position = new_position
+            if self.is_dirty:
+                self.render()
+                self.is_dirty = False
+                sounds.update()
+                self.clock.tick(self.frame_cap)
+
+    def show_replay_position(self, game, position: int):
+        # назад партия не отматывается, а заново проигрывается с начала до нужного хода
+        self.set_game(game.replay(position))
+        self.redraw_all()
+
     def finish(self):
         self.is_game_process = False
 
-    def render(self):
-        self.screen.fill(pygame.Color(27, 27, 27))
-        cell_sprites.draw(self.screen)
+    def redraw_all(self):
+        # полная перерисовка при смене режима, дальше обновляются только изменения
+        self.screen.blit(self.background, (0, 0))
+        self.hud_text = None
+        self.hud_rect = None
+        self.overlay_rect = None
+        self.view.repaint_rect(self.screen.get_rect())
+        self.render()
+        pygame.display.flip()
+
+    def hud(self):
+        if type(self.board) != BlitzBoard:
+            return None
+        if self.board.timer > 0:
+            return str(self.board.timer).rjust(15), 200, (900, 200)
+        return 'Переход хода!', 100, (1300, 200)
 
-    def manage_events(self):
-        for event in pygame.event.get():
+    def render(self):
+        hud = self.hud()
+        hud_text = hud[0] if hud else None
+        is_hud_changed = hud_text != self.hud_text
+        if is_hud_changed and self.hud_rect:
+            # старая надпись стирается перерисовкой фона и клеток под ней
+            self.view.repaint_rect(self.hud_rect)
+        if self.overlay_rect:
+            self.view.repaint_rect(self.overlay_rect)
+            self.overlay_rect = None
+        rects = self.view.draw(self.screen, self.background)
+        if hud and (is_hud_changed or self.hud_rect.collidelist(rects) != -1):
+            text, size, position = hud
+            new_rect = self.screen.blit(render_text(TEXT_FONT, size, text), position)
+            rects.append(new_rect)
+            self.hud_rect = new_rect
+        self.hud_text = hud_text
+        if profiler.is_overlay_shown:
+            self.overlay_rect = self.draw_overlay()
+            rects.append(self.overlay_rect)
+        if rects:
+            pygame.display.update(rects)
+
+    def draw_overlay(self):
+        # оверлей профайлера в левом верхнем углу, перерисовывается каждый кадр
+        lines = profiler.summary() or ['collecting...']
+        # строки оверлея меняются каждый кадр, поэтому не кэшируются и не вытесняют надписи
+        font = get_font(OVERLAY_FONT, 20)
+        line_height = font.get_linesize()
+        overlay = pygame.Surface((420, line_height * len(lines) + 10))
+        overlay.fill(pygame.Color(0, 0, 0))
+        for number, line in enumerate(lines):
+            overlay.blit(font.render(line, True, (0, 255, 0)), (5, 5 + line_height * number))
+        return self.screen.blit(overlay, (0, 0))
+
+    def is_computer_turn(self):
+        return self.computer is not None and self.board.current_direction == self.computer.direction
+
+    def manage_events(self, events: list):
+        for event in events:
+            self.is_dirty = True
             if event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_ESCAPE:
                     self.finish()
+                if event.key == pygame.K_F3 and profiler.is_enabled:
+                    profiler.is_overlay_shown = not profiler.is_overlay_shown
+            if type(self.view) == CameraView:
+                self.manage_camera_event(event)
+            if self.is_computer_turn() and event.type in (pygame.MOUSEBUTTONDOWN, pygame.MOUSEBUTTONUP):
+                continue
             if event.type == pygame.MOUSEBUTTONDOWN:
                 if event.button == 1:
-                    self.board.mouse_down_processing(event.pos)
+                    self.view.mouse_down_processing(event.pos)
             if event.type == pygame.MOUSEBUTTONUP:
                 if event.button == 1:
-                    self.board.mouse_up_processing(event.pos)
-                    self.board.mouse_up_processing(event.pos)
+                    self.view.mouse_up_processing(event.pos)
             if event.type == pygame.MOUSEMOTION:
-                self.board.on_mouse_motion(event.pos)
-            if event.type == pygame.USEREVENT:
-                if type(self.board) == BlitzBoard:
-                    self.board.timer -= 1
-
-
-game = GameManager()
-game.start()
+                self.view.on_mouse_motion(event.pos)
+
+    def manage_camera_event(self, event):
+        # колесо - масштаб, правая кнопка и стрелки - прокрутка поля
+        scroll_keys = {pygame.K_LEFT: (-1, 0), pygame.K_RIGHT: (1, 0), pygame.K_UP: (0, -1), pygame.K_DOWN: (0, 1)}
+        if event.type == pygame.MOUSEWHEEL:
+            self.view.set_zoom(pygame.mouse.get_pos(), event.y)
+        elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 3:
+            self.view.start_pan(event.pos)
+        elif event.type == pygame.MOUSEBUTTONUP and event.button == 3:
+            self.view.end_pan()
+        elif event.type == pygame.KEYDOWN and event.key in scroll_keys:
+            self.view.scroll(*scroll_keys[event.key])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--profile', metavar='TRACE', help='measure frames, F3 shows the overlay, '
+                                                           'the Chrome trace is saved to TRACE on exit')
+    parser.add_argument('--record', metavar='FILE', help='append a replay of the game to FILE')
+    parser.add_argument('--replay', metavar='FILE', help='watch a recorded game instead of playing')
+    parser.add_argument('--game', type=int, default=0, help='number of the game in the replay file')
+    parser.add_argument('--mute', action='store_true', help='no sounds and music')
+    parser.add_argument('--fps', type=int, default=60, help='frame cap')
+    parser.add_argument('--save', metavar='FILE', help='keep the unfinished game in FILE and resume it on start')
+    parser.add_argument('--size', type=int, default=8, help='side of the board, large boards get a scrollable camera')
+    args = parser.parse_args()
+    if args.profile:
+        profiler.enable()
+    # mute задаётся до создания GameManager, чтобы загрузчик не загружал звуки
+    sounds.is_muted = args.mute
+    game = GameManager()
+    game.side_size = args.size
+    game.frame_cap = args.fps
+    game.save_path = args.save
+    if args.replay:
+        game.watch(load_game(args.replay, args.game))
+    elif args.record:
+        with open(args.record, 'ab') as replay_file:
+            game.recorder = ReplayRecorder(replay_file)
+            game.start()
+    else:
+        game.start()
+    if args.profile:
+        profiler.export_chrome_trace(args.profile)
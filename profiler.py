@@ -0,0 +1,100 @@
+import json
+import time
+from collections import Counter, deque
+from contextlib import contextmanager, nullcontext
+
+
+# замер времени кадра по участкам и счётчики тяжёлых вызовов;
+# по умолчанию выключен и почти ничего не стоит
+class FrameProfiler:
+    def __init__(self, size: int = 600):
+        self.is_enabled = False
+        self.is_overlay_shown = False
+        # последние size кадров: начало, длительность, участки и счётчики
+        self.frames = deque(maxlen=size)
+        self.counters = Counter()
+        self.sections = []
+        self.frame_start = None
+
+    def enable(self):
+        self.is_enabled = True
+        self.frame_start = None
+
+    def begin_frame(self):
+        if not self.is_enabled:
+            return None
+        self.frame_start = time.perf_counter()
+        self.sections = []
+        self.counters = Counter()
+
+    def end_frame(self):
+        if not self.is_enabled or self.frame_start is None:
+            return None
+        self.frames.append({
+            'start': self.frame_start,
+            'duration': time.perf_counter() - self.frame_start,
+            'sections': self.sections,
+            'counters': dict(self.counters),
+        })
+        self.frame_start = None
+
+    def section(self, name: str):
+        if not self.is_enabled:
+            return nullcontext()
+        return self.timed_section(name)
+
+    @contextmanager
+    def timed_section(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.sections.append((name, start, time.perf_counter() - start))
+
+    def count(self, name: str, value: int = 1):
+        if self.is_enabled:
+            self.counters[name] += value
+
+    def fps(self):
+        if len(self.frames) < 2:
+            return 0.0
+        elapsed = self.frames[-1]['start'] - self.frames[0]['start']
+        return (len(self.frames) - 1) / elapsed if elapsed > 0 else 0.0
+
+    def summary(self):
+        # строки для оверлея: FPS, самый долгий кадр и среднее время участков
+        if not self.frames:
+            return []
+        totals = Counter()
+        counters = Counter()
+        for frame in self.frames:
+            for name, _, duration in frame['sections']:
+                totals[name] += duration
+            counters.update(frame['counters'])
+        worst = max(frame['duration'] for frame in self.frames)
+        lines = [f'FPS {self.fps():.1f}  worst frame {worst * 1000:.1f} ms']
+        for name, total in totals.most_common():
+            lines.append(f'{name}: {total / len(self.frames) * 1000:.2f} ms')
+        for name, value in counters.most_common():
+            lines.append(f'{name}: {value}')
+        return lines
+
+    def export_json(self, path: str):
+        with open(path, 'w') as file:
+            json.dump(list(self.frames), file)
+
+    def export_chrome_trace(self, path: str):
+        # формат chrome://tracing и Perfetto: события "X" с временем в микросекундах
+        events = []
+        for number, frame in enumerate(self.frames):
+            events.append({'name': 'frame', 'ph': 'X', 'pid': 1, 'tid': 1,
+                           'ts': frame['start'] * 1e6, 'dur': frame['duration'] * 1e6,
+                           'args': {'number': number, **frame['counters']}})
+            for name, start, duration in frame['sections']:
+                events.append({'name': name, 'ph': 'X', 'pid': 1, 'tid': 1,
+                               'ts': start * 1e6, 'dur': duration * 1e6})
+        with open(path, 'w') as file:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, file)
+
+
+profiler = FrameProfiler()
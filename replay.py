@@ -0,0 +1,189 @@
+from contextlib import nullcontext
+import mmap
+import os
+import struct
+
+from engine import Direction, MOVE_ADD, MOVE_ACTIVATE, MOVE_PASS, all_game_modes, default_spawn_table, \
+    uniform_spawn_table
+
+# запись партий: seed поля и поток ходов. Файл только дописывается, в нём
+# подряд идут партии, каждая - это записи фиксированного размера:
+#   G  начало партии: версия, режим, размер поля, seed
+#   A  поставлена клетка: номер в added, x, y
+#   C  нажата клетка: x, y
+#   P  ход перешёл без действия (таймер блитца)
+#   E  конец партии: победитель (Direction.value, 0 - партия не закончена)
+# версия 1 - клетки выпадали равновероятно, версия 2 - по таблице all_cells_chances
+VERSION = 2
+spawn_tables = {1: uniform_spawn_table, 2: default_spawn_table}
+records = {
+    b'G': struct.Struct('<BBHq'),
+    b'A': struct.Struct('<BHH'),
+    b'C': struct.Struct('<HH'),
+    b'P': struct.Struct(''),
+    b'E': struct.Struct('<B'),
+}
+
+
+def encode_move(move: tuple):
+    if move[0] == MOVE_ADD:
+        return b'A' + records[b'A'].pack(*move[1:])
+    if move[0] == MOVE_ACTIVATE:
+        return b'C' + records[b'C'].pack(*move[1:])
+    return b'P'
+
+
+def decode_move(record_type: bytes, values: tuple):
+    if record_type == b'A':
+        return (MOVE_ADD, *values)
+    if record_type == b'C':
+        return (MOVE_ACTIVATE, *values)
+    return (MOVE_PASS,)
+
+
+# пишет ходы партии в открытый на дозапись бинарный файл после каждой смены хода,
+# поэтому при падении игры теряется не больше одного хода
+class ReplayRecorder:
+    def __init__(self, file):
+        self.file = file
+        self.board = None
+        self.written = 0
+
+    def start_game(self, board):
+        if board.seed is None:
+            raise ValueError('only boards created with a seed can be recorded')
+        if board.spawn_table is not default_spawn_table:
+            raise ValueError('only boards with the default spawn table can be recorded')
+        self.board = board
+        self.written = 0
+        mode = all_game_modes.index(type(board))
+        self.file.write(b'G' + records[b'G'].pack(VERSION, mode, board.side_size, board.seed))
+        board.listeners.append(self.on_board_event)
+
+    def on_board_event(self, event: str, x: int, y: int):
+        if event == 'turn':
+            self.flush_moves()
+
+    def flush_moves(self):
+        history = self.board.history
+        self.file.write(b''.join(encode_move(move) for move in history[self.written:]))
+        self.written = len(history)
+        self.file.flush()
+
+    def end_game(self):
+        self.flush_moves()
+        self.board.is_win()
+        winner = self.board.winner.value if self.board.winner else 0
+        self.file.write(b'E' + records[b'E'].pack(winner))
+        self.file.flush()
+        self.board.listeners.remove(self.on_board_event)
+        self.board = None
+
+
+def record_game(board):
+    # партия, сыгранная без записи, целиком в байтах (история ходов хранится в поле)
+    if board.spawn_table is not default_spawn_table:
+        raise ValueError('only boards with the default spawn table can be recorded')
+    parts = [b'G' + records[b'G'].pack(VERSION, all_game_modes.index(type(board)), board.side_size, board.seed)]
+    parts.extend(encode_move(move) for move in board.history)
+    winner = board.winner.value if board.is_win() else 0
+    parts.append(b'E' + records[b'E'].pack(winner))
+    return b''.join(parts)
+
+
+class RecordedGame:
+    def __init__(self, offset: int, mode, side_size: int, seed: int, spawn_table=default_spawn_table):
+        self.offset = offset
+        self.mode = mode
+        self.side_size = side_size
+        self.seed = seed
+        self.spawn_table = spawn_table
+        self.moves = []
+        self.winner = None
+
+    def replay(self, until: int = None):
+        # восстанавливает поле после первых until ходов, без окна и спрайтов
+        board = self.mode(self.side_size, self.seed, self.spawn_table)
+        for move in self.moves[:until]:
+            board.apply_move(move)
+        return board
+
+    def read_moves(self, data):
+        # ходы партии из данных файла: от её заголовка до конца партии или следующей партии
+        self.moves = []
+        for position, record_type, record in read_records(data, self.offset + 1 + records[b'G'].size):
+            if record_type == b'G' or record_type == b'E':
+                break
+            self.moves.append(decode_move(record_type, record.unpack_from(data, position + 1)))
+
+
+# полный размер записи по первому байту, 0 - неизвестная запись
+record_sizes = [0] * 256
+for record_type, record in records.items():
+    record_sizes[record_type[0]] = 1 + record.size
+GAME_START = b'G'[0]
+GAME_END = b'E'[0]
+
+
+def read_records(data, position: int = 0):
+    # записи с позиции position: (позиция, тип, формат); значения распаковывает вызывающий,
+    # поэтому ненужные записи только пропускаются
+    while position < len(data):
+        record_type = data[position:position + 1]
+        record = records.get(record_type)
+        if record is None:
+            raise ValueError(f'unknown record {record_type!r} at byte {position}')
+        yield position, record_type, record
+        position += 1 + record.size
+
+
+def map_file(file):
+    # файл отображается в память, а не читается целиком; пустой файл отобразить нельзя
+    if os.fstat(file.fileno()).st_size == 0:
+        return nullcontext(b'')
+    return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def scan_games(data, with_moves: bool = True):
+    # у записей ходов без with_moves читается только первый байт, чтобы найти следующую запись
+    game = None
+    position = 0
+    end = len(data)
+    while position < end:
+        code = data[position]
+        size = record_sizes[code]
+        if not size:
+            raise ValueError(f'unknown record {bytes([code])!r} at byte {position}')
+        if code == GAME_START:
+            if game is not None:
+                yield game
+            version, mode, side_size, seed = records[b'G'].unpack_from(data, position + 1)
+            if version not in spawn_tables:
+                raise ValueError(f'unsupported replay version {version}')
+            game = RecordedGame(position, all_game_modes[mode], side_size, seed, spawn_tables[version])
+        elif code == GAME_END:
+            winner = data[position + 1]
+            game.winner = Direction(winner) if winner else None
+        elif with_moves:
+            record_type = bytes([code])
+            game.moves.append(decode_move(record_type, records[record_type].unpack_from(data, position + 1)))
+        position += size
+    if game is not None:
+        yield game
+
+
+def read_games(path: str, with_moves: bool = True):
+    # все партии файла по порядку; without moves - только заголовки и победители,
+    # а offset партии позволяет потом прочитать её ходы через load_game
+    with open(path, 'rb') as file, map_file(file) as data:
+        yield from scan_games(data, with_moves)
+
+
+def load_game(path: str, number: int):
+    # партия number с ходами: заголовки служат индексом, ходы декодируются только у неё
+    with open(path, 'rb') as file, map_file(file) as data:
+        for index, game in enumerate(scan_games(data, with_moves=False)):
+            if index == number:
+                game.read_moves(data)
+                return game
+    raise IndexError(f'no game {number} in {path}')
@@ -0,0 +1,292 @@
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+
+from engine import Direction, BlitzBoard, all_game_modes, encode_cell, opponent
+
+# сервер сетевой игры: партии живут на сервере, клиенты присылают только ходы,
+# а после каждого хода получают изменившиеся клетки.
+# протокол - JSON по строке на сообщение:
+#   клиент: {"type": "join", "mode": "DefaultBoard"}, {"type": "add", "index": 0, "x": 3, "y": 4},
+#           {"type": "activate", "x": 3, "y": 4}, {"type": "resign"}
+#   сервер: start (полное поле), delta (изменения за ход), end (победитель), error
+game_modes = {mode.__name__: mode for mode in all_game_modes}
+# в блитце ход длится 5 секунд таймера и ещё 2 секунды надписи "Переход хода!"
+BLITZ_TURN_TIME = 7
+
+
+class Player:
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+        self.direction = None
+        self.match = None
+
+    def send(self, message: dict):
+        if not self.writer.is_closing():
+            self.writer.write(json.dumps(message, separators=(',', ':')).encode() + b'\n')
+
+
+class Match:
+    def __init__(self, match_id: int, mode: str, players: list, side_size: int, seed: int):
+        self.match_id = match_id
+        self.mode = mode
+        self.board = game_modes[mode](side_size, seed)
+        self.players = {Direction.ORANGE: players[0], Direction.BLUE: players[1]}
+        self.changed = set()
+        self.is_finished = False
+        self.deadline = time.monotonic() + BLITZ_TURN_TIME
+        self.timer_task = None
+        self.board.listeners.append(self.on_board_event)
+        for direction, player in self.players.items():
+            player.direction = direction
+            player.match = self
+
+    def on_board_event(self, event: str, x: int, y: int):
+        if event == 'cell':
+            self.changed.add((x, y))
+        elif event == 'turn':
+            self.deadline = time.monotonic() + BLITZ_TURN_TIME
+
+    def turn_state(self):
+        state = {
+            'turn': self.board.turn_number,
+            'direction': self.board.current_direction.name,
+            'added': [kind.__name__ for kind in self.board.added],
+        }
+        if type(self.board) == BlitzBoard:
+            state['time_left'] = round(max(0.0, self.deadline - time.monotonic()), 2)
+        return state
+
+    def start(self):
+        cells = [encode_cell(cell, False) for row in self.board.table for cell in row]
+        for direction, player in self.players.items():
+            player.send({'type': 'start', 'match': self.match_id, 'mode': self.mode, 'you': direction.name,
+                         'side_size': self.board.side_size, 'cells': cells, **self.turn_state()})
+        if type(self.board) == BlitzBoard:
+            self.timer_task = asyncio.create_task(self.run_timer())
+
+    async def run_timer(self):
+        # таймер блитца идёт на сервере по монотонным часам, а не по событиям клиента
+        while not self.is_finished:
+            turn_number = self.board.turn_number
+            await asyncio.sleep(max(0.0, self.deadline - time.monotonic()))
+            if not self.is_finished and self.board.turn_number == turn_number:
+                self.board.pass_turn()
+                self.broadcast_delta()
+
+    def apply(self, player: Player, message: dict):
+        if self.is_finished:
+            return 'match is over'
+        if message['type'] == 'resign':
+            self.finish(opponent(player.direction))
+            return None
+        if player.direction != self.board.current_direction:
+            return 'not your turn'
+        # координаты и номер клетки - только целые числа: json пропускает 1e999 и Infinity
+        x, y = message['x'], message['y']
+        if type(x) != int or type(y) != int:
+            return 'cell coordinates must be integers'
+        if not (0 <= x < self.board.side_size and 0 <= y < self.board.side_size):
+            return 'cell out of board'
+        if message['type'] == 'add':
+            index = message['index']
+            if type(index) != int:
+                return 'cell index must be an integer'
+            if not 0 <= index < len(self.board.added):
+                return 'no such cell to add'
+            is_done = self.board.add_new_cell(index, x, y)
+        else:
+            is_done = self.board.activate(x, y)
+        if not is_done:
+            return 'illegal move'
+        self.broadcast_delta()
+        if self.board.is_win():
+            self.finish(self.board.winner)
+        return None
+
+    def broadcast_delta(self):
+        cells = [[x, y, *encode_cell(self.board.table[y][x], False)] for x, y in sorted(self.changed)]
+        self.changed.clear()
+        for player in self.players.values():
+            player.send({'type': 'delta', 'cells': cells, **self.turn_state()})
+
+    def finish(self, winner: Direction):
+        self.is_finished = True
+        if self.timer_task is not None:
+            self.timer_task.cancel()
+        for player in self.players.values():
+            player.send({'type': 'end', 'winner': winner.name})
+            player.match = None
+
+
+class GameServer:
+    def __init__(self, side_size: int = 8, seed: int = None):
+        self.side_size = side_size
+        self.seeds = random.Random(seed)
+        self.waiting = {}
+        self.match_ids = itertools.count(1)
+        self.active_matches = set()
+
+    async def start(self, host: str = '127.0.0.1', port: int = 0):
+        return await asyncio.start_server(self.handle_client, host, port)
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        player = Player(writer)
+        try:
+            async for line in reader:
+                try:
+                    message = json.loads(line)
+                    error = self.handle_message(player, message)
+                except (ValueError, KeyError, TypeError) as exception:
+                    error = f'bad message: {exception}'
+                if error:
+                    player.send({'type': 'error', 'message': error})
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.disconnect(player)
+            writer.close()
+
+    def handle_message(self, player: Player, message: dict):
+        if message['type'] == 'join':
+            return self.join(player, message.get('mode', 'DefaultBoard'))
+        if player.match is None:
+            return 'not in a match'
+        if message['type'] not in ('add', 'activate', 'resign'):
+            return f'unknown message type {message["type"]}'
+        match = player.match
+        error = match.apply(player, message)
+        if match.is_finished:
+            self.on_match_finished(match)
+        return error
+
+    def join(self, player: Player, mode: str):
+        if mode not in game_modes:
+            return f'unknown mode {mode}'
+        if player.match is not None or player in self.waiting.values():
+            return 'already joined'
+        opponent_player = self.waiting.pop(mode, None)
+        if opponent_player is None:
+            self.waiting[mode] = player
+            return None
+        match = Match(next(self.match_ids), mode, [opponent_player, player], self.side_size,
+                      self.seeds.getrandbits(32))
+        self.active_matches.add(match)
+        match.start()
+        return None
+
+    def disconnect(self, player: Player):
+        for mode, waiting_player in list(self.waiting.items()):
+            if waiting_player is player:
+                del self.waiting[mode]
+        if player.match is not None and not player.match.is_finished:
+            match = player.match
+            match.finish(opponent(player.direction))
+            self.on_match_finished(match)
+
+    def on_match_finished(self, match: Match):
+        self.active_matches.discard(match)
+
+
+# простой клиент для проверки сервера: зеркалит поле по сообщениям
+# и ходит в случайную клетку рядом со своими, пока сервер не примет ход
+async def simulated_client(host: str, port: int, mode: str, seed: int):
+    reader, writer = await asyncio.open_connection(host, port)
+    rng = random.Random(seed)
+    cells = {}
+    me = None
+    side_size = 0
+    attempts = []
+
+    def send(message):
+        writer.write(json.dumps(message).encode() + b'\n')
+
+    def candidates():
+        own = {position for position, (kind, owner, mask) in cells.items() if owner == me.value}
+        result = []
+        for x, y in cells:
+            neighbors = [(x, y + 1), (x, y - 1), (x + 1, y), (x - 1, y)]
+            if any(neighbor in own for neighbor in neighbors):
+                result.append((x, y))
+        rng.shuffle(result)
+        return result
+
+    def move(message):
+        nonlocal attempts
+        if message['direction'] != me.name:
+            return None
+        attempts = candidates()
+        try_next()
+
+    def try_next():
+        if not attempts:
+            send({'type': 'resign'})
+            return None
+        x, y = attempts.pop()
+        send({'type': 'add', 'index': rng.randrange(3), 'x': x, 'y': y})
+
+    send({'type': 'join', 'mode': mode})
+    winner = None
+    async for line in reader:
+        message = json.loads(line)
+        if message['type'] == 'start':
+            me = Direction[message['you']]
+            side_size = message['side_size']
+            for index, cell in enumerate(message['cells']):
+                cells[(index % side_size, index // side_size)] = tuple(cell)
+            move(message)
+        elif message['type'] == 'delta':
+            for x, y, kind, owner, mask in message['cells']:
+                cells[(x, y)] = (kind, owner, mask)
+            move(message)
+        elif message['type'] == 'error':
+            try_next()
+        elif message['type'] == 'end':
+            winner = message['winner']
+            break
+        await writer.drain()
+    writer.close()
+    return winner
+
+
+async def run_loopback(matches: int, mode: str, side_size: int):
+    # сервер и 2 * matches клиентов в одном процессе на 127.0.0.1
+    game_server = GameServer(side_size, seed=0)
+    server = await game_server.start()
+    host, port = server.sockets[0].getsockname()[:2]
+    start = time.perf_counter()
+    clients = [simulated_client(host, port, mode, seed) for seed in range(matches * 2)]
+    winners = await asyncio.gather(*clients)
+    elapsed = time.perf_counter() - start
+    server.close()
+    await server.wait_closed()
+    print(f'{matches} {mode} matches in {elapsed:.2f} s, winners: '
+          f'ORANGE {winners.count("ORANGE") // 2}, BLUE {winners.count("BLUE") // 2}')
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description='Game server')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--size', type=int, default=8)
+    parser.add_argument('--loopback', type=int, metavar='MATCHES', help='run simulated clients instead of serving')
+    parser.add_argument('--mode', default='DefaultBoard', choices=list(game_modes))
+    args = parser.parse_args(arguments)
+
+    if args.loopback:
+        asyncio.run(run_loopback(args.loopback, args.mode, args.size))
+        return None
+
+    async def serve():
+        server = await GameServer(args.size).start(args.host, args.port)
+        async with server:
+            await server.serve_forever()
+    asyncio.run(serve())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+import argparse
+import csv
+import multiprocessing
+import random
+import sys
+from collections import Counter, defaultdict
+
+from engine import Direction, ChangedCell, ClickableCell, SpawnTable, MOVE_ADD, all_cells, all_game_modes
+from replay import record_game
+
+# пакетный прогон партий случайных игроков на всех ядрах:
+# python simulate.py --games 10000 --output results.csv
+# таймер блитца в симуляции не идёт, ходы делаются мгновенно
+game_modes = {mode.__name__: mode for mode in all_game_modes}
+# версия правил симуляции: меняется, когда play_game или choose_move играют партии иначе,
+# чтобы сохранённые результаты старых партий не смешивались с новыми (см. tune.py)
+SIMULATION_VERSION = 2
+usage_columns = [f'add_{kind.__name__}' for kind in all_cells] + \
+                [f'activate_{kind.__name__}' for kind in all_cells if issubclass(kind, ClickableCell)]
+columns = ['mode', 'seed', 'winner', 'turns', 'cause'] + usage_columns
+
+
+def choose_move(board, policy: random.Random, activate_chance: float):
+    moves = board.legal_moves()
+    if not moves:
+        return None
+    activations = [move for move in moves if move[0] != MOVE_ADD]
+    if activations and policy.random() < activate_chance:
+        return policy.choice(activations)
+    drops = [move for move in moves if move[0] == MOVE_ADD]
+    return policy.choice(drops or activations)
+
+
+def move_name(board, move):
+    if move[0] == MOVE_ADD:
+        return f'add_{board.added[move[1]].__name__}'
+    x, y = move[1:]
+    cell = board.table[y][x]
+    clickable = cell.mask_cell if type(cell) == ChangedCell else cell
+    return f'activate_{type(clickable).__name__}'
+
+
+def play_game(task):
+    # одна партия; и поле, и игроки берут случайность из генераторов с seed партии
+    # weights - веса появления клеток, None - таблица по умолчанию
+    mode_name, seed, side_size, max_turns, activate_chance, is_recording, weights = task
+    board = game_modes[mode_name](side_size, seed, SpawnTable(weights) if weights else None)
+    policy = random.Random(f'policy-{seed}')
+    usage = Counter()
+    last_move = ''
+    while not board.is_win() and board.turn_number < max_turns:
+        move = choose_move(board, policy, activate_chance)
+        if move is None:
+            board.pass_turn()
+            continue
+        last_move = move_name(board, move)
+        usage[last_move] += 1
+        board.apply_move(move)
+    is_finished = board.is_win()
+    row = {
+        'mode': mode_name,
+        'seed': seed,
+        'winner': board.winner.name if is_finished else 'DRAW',
+        'turns': board.turn_number,
+        'cause': last_move if is_finished else '',
+    }
+    for column in usage_columns:
+        row[column] = usage[column]
+    if is_recording:
+        row['replay'] = record_game(board)
+    return row
+
+
+def print_summary(rows_by_mode, output=sys.stdout):
+    for mode_name, rows in rows_by_mode.items():
+        games = len(rows)
+        winners = Counter(row['winner'] for row in rows)
+        causes = Counter(row['cause'] for row in rows if row['cause'])
+        average_turns = sum(row['turns'] for row in rows) / games
+        print(f'{mode_name}: {games} games, average length {average_turns:.1f} turns', file=output)
+        for side in [Direction.ORANGE.name, Direction.BLUE.name, 'DRAW']:
+            print(f'  {side}: {winners[side] / games:.1%}', file=output)
+        for cause, count in causes.most_common():
+            print(f'  capital lost to {cause}: {count}', file=output)
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description='Batch self-play simulation')
+    parser.add_argument('--games', type=int, default=1000, help='games per mode')
+    parser.add_argument('--modes', nargs='+', default=list(game_modes), choices=list(game_modes))
+    parser.add_argument('--size', type=int, default=8)
+    parser.add_argument('--seed', type=int, default=0, help='seed of the first game')
+    parser.add_argument('--max-turns', type=int, default=1000)
+    parser.add_argument('--activate-chance', type=float, default=0.15)
+    parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count())
+    parser.add_argument('--output', default='simulation.csv')
+    parser.add_argument('--record', help='append replays of all games to this file')
+    parser.add_argument('--weights', type=float, nargs=len(all_cells), metavar='W',
+                        help='spawn weights in the order ' + ' '.join(kind.__name__ for kind in all_cells))
+    args = parser.parse_args(arguments)
+    if args.record and args.weights:
+        parser.error('games with custom spawn weights cannot be recorded')
+
+    tasks = [(mode_name, args.seed + game, args.size, args.max_turns, args.activate_chance, bool(args.record),
+              args.weights) for mode_name in args.modes for game in range(args.games)]
+    rows_by_mode = defaultdict(list)
+    replays = open(args.record, 'ab') if args.record else None
+    with open(args.output, 'w', newline='') as file, multiprocessing.Pool(args.workers) as pool:
+        writer = csv.DictWriter(file, fieldnames=columns)
+        writer.writeheader()
+        for row in pool.imap_unordered(play_game, tasks, chunksize=32):
+            if replays:
+                replays.write(row.pop('replay'))
+            writer.writerow(row)
+            rows_by_mode[row['mode']].append(row)
+    if replays:
+        replays.close()
+    print_summary(rows_by_mode)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+import mmap
+import os
+import struct
+from array import array
+
+from engine import Direction, BlitzBoard, ChangedCell, SpawnTable, all_cells, all_game_modes, \
+    cell_kinds, default_spawn_table, encode_cell, get_cell, kind_codes, uniform_spawn_table, zobrist_key, \
+    BLUE_TO_MOVE_KEY
+
+# снимок партии в середине: поле, маски, клетки added, чей ход, таймер блитца и состояние
+# генератора, чтобы продолжение партии было таким же, как без снимка. Снимки пишутся в файл
+# подряд; при чтении файл отображается в память, и заголовок и слои поля читаются без
+# копирования, а поле собирается только по restore:
+#   заголовок, коды added, веса появления (если свои), генератор, ничьи клетки,
+#   слои по side * side байт: вид, владелец, маска (-1 - нет), раскрыта ли маска
+MAGIC = b'SNAP'
+VERSION = 1
+header = struct.Struct('<4sBIBHBbIBB')
+# таймер у режимов без таймера
+NO_TIMER = -128
+# таблица появления клеток: по умолчанию, равновероятная или свои веса
+DEFAULT_SPAWNS = 0
+UNIFORM_SPAWNS = 1
+CUSTOM_SPAWNS = 2
+weights_record = struct.Struct(f'<{len(all_cells)}d')
+random_record = struct.Struct('<625IBd')
+count_record = struct.Struct('<I')
+
+
+def encode_snapshot(board):
+    side_size = board.side_size
+    if board.spawn_table is default_spawn_table:
+        spawns, weights = DEFAULT_SPAWNS, b''
+    elif board.spawn_table.weights is None:
+        spawns, weights = UNIFORM_SPAWNS, b''
+    else:
+        spawns, weights = CUSTOM_SPAWNS, weights_record.pack(*board.spawn_table.weights)
+    version, state, gauss = board.random.getstate()
+    random_state = random_record.pack(*state, gauss is not None, gauss or 0.0)
+    free_cells = count_record.pack(len(board.free_cells)) + array('I', board.free_cells).tobytes()
+    kinds = bytearray(side_size * side_size)
+    owners = bytearray(side_size * side_size)
+    masks = array('b', bytes(side_size * side_size))
+    revealed = bytearray(side_size * side_size)
+    index = 0
+    for row in board.table:
+        for cell in row:
+            kinds[index], owners[index], masks[index] = encode_cell(cell)
+            if type(cell) == ChangedCell and cell.is_revealed:
+                revealed[index] = 1
+            index += 1
+    body = b''.join([bytes(kind_codes[kind] for kind in board.added), weights, random_state, free_cells,
+                     kinds, owners, masks.tobytes(), revealed])
+    timer = board.timer if type(board) == BlitzBoard else NO_TIMER
+    head = header.pack(MAGIC, VERSION, header.size + len(body), all_game_modes.index(type(board)), side_size,
+                       board.current_direction.value, timer, board.turn_number, spawns, len(board.added))
+    return head + body
+
+
+# снимок поверх буфера (bytes, mmap): поля заголовка читаются сразу, слои поля - срезы
+# memoryview без копирования
+class Snapshot:
+    def __init__(self, buffer, offset: int = 0):
+        # поля проверяются до создания memoryview: при ошибке не остаётся срезов,
+        # которые не дают закрыть mmap
+        (magic, version, self.size, mode, self.side_size, direction, timer, self.turn_number, self.spawns,
+         added_count) = header.unpack_from(buffer, offset)
+        if magic != MAGIC:
+            raise ValueError(f'no snapshot at byte {offset}')
+        if version != VERSION:
+            raise ValueError(f'unsupported snapshot version {version}')
+        if offset + self.size > len(buffer):
+            raise ValueError(f'snapshot at byte {offset} is truncated')
+        if mode >= len(all_game_modes):
+            raise ValueError(f'unknown game mode {mode} in the snapshot at byte {offset}')
+        self.offset = offset
+        self.mode = all_game_modes[mode]
+        self.current_direction = Direction(direction)
+        self.timer = None if timer == NO_TIMER else timer
+        position = offset + header.size
+        added = buffer[position:position + added_count]
+        if max(added, default=0) >= len(cell_kinds):
+            raise ValueError(f'unknown cell kind in the snapshot at byte {offset}')
+        self.added = [cell_kinds[code] for code in added]
+        position += added_count
+        self.weights = None
+        if self.spawns == CUSTOM_SPAWNS:
+            self.weights = weights_record.unpack_from(buffer, position)
+            position += weights_record.size
+        self.random_offset = position
+        position += random_record.size
+        free_count = count_record.unpack_from(buffer, position)[0]
+        position += count_record.size
+        cell_count = self.side_size * self.side_size
+        if position + 4 * free_count + 4 * cell_count > offset + self.size:
+            raise ValueError(f'snapshot at byte {offset} is damaged')
+        view = memoryview(buffer)
+        self.free_cells = view[position:position + 4 * free_count]
+        position += 4 * free_count
+        self.kinds, self.owners, self.masks, self.revealed = (
+            view[position + number * cell_count:position + (number + 1) * cell_count] for number in range(4))
+        self.view = view
+
+    def spawn_table(self):
+        if self.spawns == DEFAULT_SPAWNS:
+            return default_spawn_table
+        if self.spawns == UNIFORM_SPAWNS:
+            return uniform_spawn_table
+        return SpawnTable(self.weights)
+
+    def random_state(self):
+        values = random_record.unpack_from(self.view, self.random_offset)
+        return 3, values[:625], values[626] if values[625] else None
+
+    def restore(self):
+        # поле собирается через set_cell, поэтому хэш, границы и реестры клеток
+        # считаются как в игре; порядок ничьих клеток и генератор восстанавливаются точно
+        board = self.mode(self.side_size, 0, self.spawn_table())
+        masks = self.masks.cast('b')
+        for index in range(self.side_size * self.side_size):
+            kind = cell_kinds[self.kinds[index]]
+            direction = Direction(self.owners[index])
+            if kind == ChangedCell:
+                cell = get_cell(kind, direction, cell_kinds[masks[index]], bool(self.revealed[index]))
+            else:
+                cell = get_cell(kind, direction)
+            x, y = index % self.side_size, index // self.side_size
+            if board.table[y][x] is not cell:
+                board.set_cell(x, y, cell)
+        board.free_cells = array('l', array('I', self.free_cells.tobytes()))
+        for position, index in enumerate(board.free_cells):
+            board.free_positions[index] = position
+        if board.current_direction != self.current_direction:
+            board.hash ^= zobrist_key(BLUE_TO_MOVE_KEY)
+        board.current_direction = self.current_direction
+        board.added = list(self.added)
+        board.turn_number = self.turn_number
+        if self.timer is not None:
+            board.timer = self.timer
+        board.random.setstate(self.random_state())
+        # снимок не содержит начала партии, поэтому восстановленное поле не записывается в replay
+        board.seed = None
+        return board
+
+    def release(self):
+        for view in (self.free_cells, self.kinds, self.owners, self.masks, self.revealed, self.view):
+            view.release()
+
+
+def read_snapshots(buffer):
+    # все снимки буфера по порядку
+    offset = 0
+    while offset < len(buffer):
+        snapshot = Snapshot(buffer, offset)
+        yield snapshot
+        offset += snapshot.size
+
+
+def save_snapshot(path: str, board, is_appended: bool = False):
+    # снимок сбрасывается на диск до возврата, чтобы после отключения питания
+    # файл не оказался пустым или недописанным
+    with open(path, 'ab' if is_appended else 'wb') as file:
+        file.write(encode_snapshot(board))
+        file.flush()
+        os.fsync(file.fileno())
+
+
+# файл снимков, отображённый в память: with SnapshotFile(path) as snapshots: ...
+# снимки действуют только внутри with, поля из них остаются и после
+class SnapshotFile:
+    def __init__(self, path: str):
+        self.path = path
+        self.file = None
+        self.buffer = None
+        self.snapshots = []
+
+    def __enter__(self):
+        # пустой файл отобразить нельзя, в нём просто нет снимков; при ошибке чтения
+        # файл закрывается сразу, потому что до __exit__ дело не дойдёт
+        self.file = open(self.path, 'rb')
+        if os.fstat(self.file.fileno()).st_size == 0:
+            self.buffer = b''
+        else:
+            self.buffer = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            for snapshot in read_snapshots(self.buffer):
+                self.snapshots.append(snapshot)
+        except (ValueError, struct.error):
+            self.__exit__()
+            raise
+        return self.snapshots
+
+    def __exit__(self, *exception):
+        # срезы снимков ссылаются на mmap и освобождаются до его закрытия
+        for snapshot in self.snapshots:
+            snapshot.release()
+        self.snapshots = []
+        if type(self.buffer) == mmap.mmap:
+            self.buffer.close()
+        self.file.close()
@@ -0,0 +1,180 @@
+import argparse
+import json
+import multiprocessing
+import os
+import random
+
+from engine import EmptyCell, all_cells, all_cells_chances
+from simulate import SIMULATION_VERSION, game_modes, play_game
+
+# подбор весов появления клеток под баланс партий:
+# python tune.py --state tuning --games 400
+# каждый раунд - случайные отклонения от лучших весов, каждый кандидат играет одни и те же
+# партии случайных игроков на всех ядрах. Результаты партий пишутся на диск по ключу
+# (веса, режим, seed, настройки), а ход подбора - в progress.json, поэтому прерванный
+# подбор продолжается с того же места. Ключ партии начинается с SIMULATION_VERSION: партии,
+# сыгранные прежней версией симуляции, при загрузке пропускаются
+PROGRESS_FILE = 'progress.json'
+CACHE_FILE = 'games.jsonl'
+# EmptyCell не выпадает в added, её вес не подбирается
+tuned = [index for index, kind in enumerate(all_cells) if kind != EmptyCell]
+
+
+def weights_key(weights):
+    return ','.join(f'{weight:g}' for weight in weights)
+
+
+def perturb(weights, generator: random.Random, scale: float):
+    # каждый подбираемый вес умножается на случайный множитель около единицы
+    result = list(weights)
+    for index in tuned:
+        result[index] = round(max(0.01, weights[index] * generator.lognormvariate(0, scale)), 3)
+    return result
+
+
+def evaluate_game(task):
+    row = play_game(task)
+    return task, row['winner'], row['turns']
+
+
+def game_loss(results: list, target_win_rate: float, target_turns: float):
+    # квадраты отклонений доли побед оранжевых, длины партии и доли ничьих от цели
+    games = len(results)
+    orange = sum(winner == 'ORANGE' for winner, turns in results) / games
+    draws = sum(winner == 'DRAW' for winner, turns in results) / games
+    turns = sum(turns for winner, turns in results) / games
+    return (orange - target_win_rate) ** 2 + ((turns - target_turns) / target_turns) ** 2 + draws ** 2
+
+
+class Tuner:
+    def __init__(self, args):
+        self.args = args
+        self.cache = {}
+        os.makedirs(args.state, exist_ok=True)
+        cache_path = os.path.join(args.state, CACHE_FILE)
+        stale = 0
+        if os.path.exists(cache_path):
+            with open(cache_path) as file:
+                for line in file:
+                    record = json.loads(line)
+                    if record['key'][0] != SIMULATION_VERSION:
+                        stale += 1
+                        continue
+                    self.cache[tuple(record['key'])] = (record['winner'], record['turns'])
+        if stale:
+            print(f'skipped {stale} cached games of another simulation version')
+        self.cache_file = open(cache_path, 'a')
+        self.progress = self.load_progress()
+
+    def load_progress(self):
+        path = os.path.join(self.args.state, PROGRESS_FILE)
+        if os.path.exists(path):
+            with open(path) as file:
+                progress = json.load(file)
+            if progress.get('version') != SIMULATION_VERSION:
+                # потеря лучших весов посчитана по партиям другой версии и считается заново
+                progress['version'] = SIMULATION_VERSION
+                progress['best_loss'] = None
+            return progress
+        return {'version': SIMULATION_VERSION, 'round': 0, 'best_weights': list(all_cells_chances),
+                'best_loss': None, 'stale_rounds': 0, 'history': []}
+
+    def save_progress(self):
+        # запись через временный файл, чтобы прерывание не оставило файл недописанным
+        path = os.path.join(self.args.state, PROGRESS_FILE)
+        with open(path + '.tmp', 'w') as file:
+            json.dump(self.progress, file, indent=2)
+        os.replace(path + '.tmp', path)
+
+    def task(self, weights, mode_name: str, seed: int):
+        args = self.args
+        return mode_name, seed, args.size, args.max_turns, args.activate_chance, False, tuple(weights)
+
+    def cache_key(self, task):
+        mode_name, seed, size, max_turns, activate_chance, _, weights = task
+        return SIMULATION_VERSION, weights_key(weights), mode_name, seed, size, max_turns, activate_chance
+
+    def evaluate(self, pool, candidates: list, seeds: range):
+        # потери кандидатов на партиях seeds; сыгранные раньше партии берутся из кэша
+        tasks = [self.task(weights, mode_name, seed) for weights in candidates
+                 for mode_name in self.args.modes for seed in seeds]
+        missing = [task for task in tasks if self.cache_key(task) not in self.cache]
+        for task, winner, turns in pool.imap_unordered(evaluate_game, missing, chunksize=8):
+            key = self.cache_key(task)
+            self.cache[key] = (winner, turns)
+            self.cache_file.write(json.dumps({'key': key, 'winner': winner, 'turns': turns}) + '\n')
+        self.cache_file.flush()
+        losses = []
+        for weights in candidates:
+            mode_losses = [game_loss([self.cache[self.cache_key(self.task(weights, mode_name, seed))]
+                                      for seed in seeds], self.args.target_win_rate, self.args.target_turns)
+                           for mode_name in self.args.modes]
+            losses.append(sum(mode_losses) / len(mode_losses))
+        return losses
+
+    def run(self):
+        args = self.args
+        progress = self.progress
+        seeds = range(args.seed, args.seed + args.games)
+        # первая часть партий отсеивает заведомо худших кандидатов
+        first_seeds = range(args.seed, args.seed + max(1, args.games // 4))
+        # разброс потерь из-за случайности партий: дисперсия доли побед 1 / (4 n) с запасом
+        noise = 1 / len(first_seeds)
+        with multiprocessing.Pool(args.workers) as pool:
+            if progress['best_loss'] is None:
+                progress['best_loss'] = self.evaluate(pool, [progress['best_weights']], seeds)[0]
+                self.save_progress()
+            print(f'start: loss {progress["best_loss"]:.5f} weights {progress["best_weights"]}')
+            while progress['round'] < args.rounds and progress['stale_rounds'] < args.patience:
+                if progress['best_loss'] <= args.tolerance:
+                    break
+                # кандидаты раунда зависят только от seed и номера раунда, поэтому после
+                # перезапуска получаются те же кандидаты и их партии берутся из кэша
+                generator = random.Random(f'{args.seed}-{progress["round"]}')
+                candidates = [perturb(progress['best_weights'], generator, args.scale)
+                              for _ in range(args.population)]
+                first_losses = self.evaluate(pool, candidates, first_seeds)
+                survivors = [weights for weights, loss in zip(candidates, first_losses)
+                             if loss <= progress['best_loss'] + noise]
+                losses = self.evaluate(pool, survivors, seeds) if survivors else []
+                round_best = min(zip(losses, survivors), default=None)
+                if round_best is not None and round_best[0] < progress['best_loss']:
+                    progress['best_loss'], progress['best_weights'] = round_best
+                    progress['stale_rounds'] = 0
+                else:
+                    progress['stale_rounds'] += 1
+                progress['history'].append({'round': progress['round'], 'survivors': len(survivors),
+                                            'best_loss': progress['best_loss']})
+                progress['round'] += 1
+                self.save_progress()
+                print(f'round {progress["round"]}: {len(survivors)}/{len(candidates)} candidates survived, '
+                      f'loss {progress["best_loss"]:.5f} weights {progress["best_weights"]}')
+        self.cache_file.close()
+        return progress['best_weights']
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description='Tune spawn weights against balance targets by self-play')
+    parser.add_argument('--state', default='tuning', help='directory with the game cache and progress')
+    parser.add_argument('--games', type=int, default=200, help='games per candidate and mode')
+    parser.add_argument('--modes', nargs='+', default=list(game_modes), choices=list(game_modes))
+    parser.add_argument('--size', type=int, default=8)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--max-turns', type=int, default=1000)
+    parser.add_argument('--activate-chance', type=float, default=0.15)
+    parser.add_argument('--rounds', type=int, default=30)
+    parser.add_argument('--population', type=int, default=8, help='candidates per round')
+    parser.add_argument('--scale', type=float, default=0.3, help='spread of the weight multipliers')
+    parser.add_argument('--patience', type=int, default=5, help='stop after this many rounds without improvement')
+    parser.add_argument('--tolerance', type=float, default=1e-4, help='stop once the loss is this small')
+    parser.add_argument('--target-win-rate', type=float, default=0.5, help='share of games won by ORANGE')
+    parser.add_argument('--target-turns', type=float, default=60, help='average game length in turns')
+    parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count())
+    args = parser.parse_args(arguments)
+
+    weights = Tuner(args).run()
+    print('all_cells_chances = [' + ', '.join(f'{weight:g}' for weight in weights) + ']')
+
+
+if __name__ == '__main__':
+    main()